@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import math
+from time import monotonic
+
+from . import config
+
+# Meshtastic modem presets: (spreading factor, bandwidth Hz, coding rate denominator)
+MODEM_PRESETS: dict[str, tuple[int, int, int]] = {
+    "ShortTurbo": (7, 500_000, 5),
+    "ShortFast": (7, 250_000, 5),
+    "ShortSlow": (8, 250_000, 5),
+    "MediumFast": (9, 250_000, 5),
+    "MediumSlow": (10, 250_000, 5),
+    "LongFast": (11, 250_000, 5),
+    "LongModerate": (11, 125_000, 8),
+    "LongSlow": (12, 125_000, 8),
+    "VeryLongSlow": (12, 62_500, 8),
+}
+
+PREAMBLE_SYMBOLS = 16
+# Meshtastic radio header (16 bytes) plus the protobuf Data wrapper around the text.
+PACKET_OVERHEAD_BYTES = 22
+
+
+def packet_airtime(payload_bytes: int, preset: str = config.MESHTASTIC_MODEM_PRESET) -> float:
+    """Estimate LoRa time-on-air in seconds for one packet (Semtech AN1200.13 formula)."""
+    sf, bw, cr = MODEM_PRESETS.get(preset, MODEM_PRESETS["MediumFast"])
+    t_sym = (2 ** sf) / bw
+    low_dr = 1 if t_sym > 0.016 else 0
+    size = payload_bytes + PACKET_OVERHEAD_BYTES
+    n_payload = 8 + max(math.ceil((8 * size - 4 * sf + 28 + 16) / (4 * (sf - 2 * low_dr))) * cr, 0)
+    return (PREAMBLE_SYMBOLS + 4.25 + n_payload) * t_sym
+
+
+def airtime_cost(payload_bytes: int, hop_limit: int = config.MESHTASTIC_HOP_LIMIT) -> float:
+    """Worst-case mesh airtime for one packet: our transmission plus one rebroadcast per hop."""
+    return packet_airtime(payload_bytes) * (1 + max(hop_limit, 0))
+
+
+class AirtimeBucket:
+    """Token bucket measured in seconds of airtime. A rate of 0 disables limiting."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, cost: float) -> float:
+        """Seconds until `cost` can be spent (0 if it can be spent now)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        # A packet that costs more than the whole bucket is allowed once the bucket is full.
+        needed = min(cost, self.burst) - self._tokens
+        return max(needed / self.rate, 0.0)
+
+    def consume(self, cost: float) -> None:
+        if self.rate <= 0:
+            return
+        self._refill()
+        self._tokens -= cost
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+
+from . import config
+
+_MAX_AGE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)", re.IGNORECASE)
+_NO_CACHE = re.compile(r"(?:^|,)\s*(?:no-cache|no-store)\b", re.IGNORECASE)
+
+
+def _http_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def freshness(headers: Mapping[str, str]) -> float | None:
+    """
+    Seconds until the response goes stale per Cache-Control max-age (minus
+    Age) or Expires (relative to Date). None if the upstream gives no hint.
+    """
+    cache_control = headers.get("Cache-Control", "")
+    if _NO_CACHE.search(cache_control):
+        return None
+    m = _MAX_AGE.search(cache_control)
+    if m:
+        try:
+            age = float(headers.get("Age", "0"))
+        except ValueError:
+            age = 0.0
+        return max(0.0, int(m.group(1)) - age)
+    expires = _http_date(headers.get("Expires"))
+    if expires is None:
+        return None
+    date = _http_date(headers.get("Date"))
+    if date is None:
+        return None
+    return max(0.0, expires - date)
+
+
+def retry_after(headers: Mapping[str, str]) -> float | None:
+    """Seconds to wait per Retry-After (delta-seconds or HTTP-date relative to Date)."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    when = _http_date(value)
+    date = _http_date(headers.get("Date"))
+    if when is None or date is None:
+        return None
+    return max(0.0, when - date)
+
+
+class Cadence:
+    """
+    Adaptive poll interval of one source.
+
+    A changed payload drops the interval to `min_interval`. Each unchanged poll
+    then grows it by `backoff`, up to the base interval while the source has
+    active alerts and up to `max_interval` once it is quiet. Upstream hints
+    (freshness, Retry-After) only ever lengthen the interval. The result always
+    stays within [min_interval, max_interval].
+    """
+
+    def __init__(
+        self,
+        base: float,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        backoff: float = config.POLL_BACKOFF,
+        adaptive: bool = config.ADAPTIVE_POLL,
+    ) -> None:
+        self.base = float(base)
+        self.min_interval = min(float(min_interval or base), self.base)
+        self.max_interval = max(float(max_interval or base), self.base)
+        self.backoff = max(1.0, backoff)
+        self.adaptive = adaptive
+        self.current = self.base
+        self.reason = "base"
+
+    @property
+    def longest(self) -> float:
+        """Longest possible gap between two polls: `max_interval` when adaptive, else the fixed base interval."""
+        return self.max_interval if self.adaptive else self.base
+
+    def update(
+        self, changed: bool, active: bool, fresh_for: float | None = None, retry_in: float | None = None
+    ) -> float:
+        """Compute the interval until the next poll from the outcome of the last one."""
+        if not self.adaptive:
+            return self.current
+
+        if changed:
+            interval, reason = self.min_interval, "alerts changed"
+        elif active:
+            interval, reason = min(self.current * self.backoff, self.base), "alerts active"
+        else:
+            interval, reason = min(self.current * self.backoff, self.max_interval), "quiet"
+
+        if fresh_for is not None and fresh_for > interval:
+            interval, reason = fresh_for, "upstream freshness"
+        if retry_in is not None and retry_in > interval:
+            interval, reason = retry_in, "upstream Retry-After"
+
+        self.current = max(self.min_interval, min(interval, self.max_interval))
+        self.reason = reason
+        return self.current
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+
+from . import config
+
+# Common phrases in VMA and SMHI texts and their short forms. Keys are matched
+# case-insensitively on word boundaries, with any whitespace between words.
+# Changing this table changes the packet IDs of compacted messages, so every
+# node in a fleet must run the same version.
+_ABBREVIATIONS = {
+    "viktigt meddelande till allmänheten": "VMA",
+    "gå inomhus och stäng dörrar, fönster och ventilation": "gå in, stäng dörrar, fönster, ventilation",
+    "sveriges radio": "SR",
+    "information": "info",
+    "kraftigt regn": "kraft. regn",
+    "kraftigt snöfall": "kraft. snöfall",
+    "kraftig vind": "kraft. vind",
+    "kraftiga vindbyar": "kraft. byar",
+    "vindbyar": "byar",
+    "risk för": "risk f.",
+    "meter per sekund": "m/s",
+    "sekundmeter": "m/s",
+    "millimeter": "mm",
+    "centimeter": "cm",
+    "kilometer": "km",
+    "procent": "%",
+    "ungefär": "ca",
+    "cirka": "ca",
+    "omkring": "ca",
+    "mycket": "mkt",
+    "till exempel": "t.ex.",
+    "bland annat": "bl.a.",
+    "med mera": "m.m.",
+    "och så vidare": "osv",
+    "från och med": "fr.o.m.",
+    "till och med": "t.o.m.",
+    "klockan": "kl",
+    "förmiddagen": "fm",
+    "eftermiddagen": "em",
+    "januari": "jan",
+    "februari": "feb",
+    "augusti": "aug",
+    "september": "sep",
+    "oktober": "okt",
+    "november": "nov",
+    "december": "dec",
+    "måndag": "mån",
+    "tisdag": "tis",
+    "onsdag": "ons",
+    "torsdag": "tors",
+    "fredag": "fre",
+    "lördag": "lör",
+    "söndag": "sön",
+}
+
+_ABBR_PATTERN = re.compile(
+    r"(?<!\w)(?:"
+    + "|".join(r"\s+".join(re.escape(w) for w in k.split()) for k in sorted(_ABBREVIATIONS, key=len, reverse=True))
+    + r")(?!\w)",
+    flags=re.IGNORECASE,
+)
+
+# Dates and times: 2025-10-26 > 26/10, 07/10 > 7/10, 08:30 > 8:30, "8:00 - 9:00" > "8:00-9:00"
+_ISO_DATE = re.compile(r"\b\d{4}-(\d{2})-(\d{2})\b")
+_DAY_MONTH = re.compile(r"\b(\d{2})/(\d{2})\b")
+_HOUR = re.compile(r"(?<![\d:])0(\d):(\d{2})(?![\d:])")
+_KL = re.compile(r"\bkl\.(?=\s)", flags=re.IGNORECASE)
+_RANGE = re.compile(r"(?<=\d) - (?=\d)")
+
+# Area lists: "Uppsala län, Stockholms län och Gotlands län" > "Uppsala, Stockholms och Gotlands län",
+# and exact repeats "Gotland, Gotland" > "Gotland".
+_AREA_SUFFIXES = ("län", "kommun", "fjällen")
+_AREA_LIST = re.compile(
+    r"(?<!\w)\w+ (" + "|".join(_AREA_SUFFIXES) + r")(?:(?:, | och )\w+ \1)+(?!\w)"
+)
+_REPEAT = re.compile(r"(?<!\w)([^\W\d_]\w*(?: [^\W\d_]\w*)?)(?:, \1)+(?!\w)")
+# "VMA: VMA i ..." > "VMA: i ..." once the description's own title has been abbreviated; the
+# tag keeps its colon, since recipients (and the UPPHÄVD/ÖVNING variants) read it as the prefix
+_TAG_REPEAT = re.compile(r"^(\w+): \1(?!\w)")
+
+
+def _abbreviate(m: re.Match[str]) -> str:
+    original = m.group(0)
+    short = _ABBREVIATIONS[" ".join(original.casefold().split())]
+    if original[0].isupper() and short[0].islower():
+        return short[0].upper() + short[1:]
+    return short
+
+
+def _collapse_area_list(m: re.Match[str]) -> str:
+    return re.sub(rf" {m.group(1)}(?=, | och )", "", m.group(0))
+
+
+def compact(text: str) -> str:
+    """
+    Shorten alert text deterministically: abbreviate common phrases, compress
+    dates and times, and collapse repeated area names. The same input always
+    gives the same output, so packet IDs still match across nodes.
+    """
+    text = _ABBR_PATTERN.sub(_abbreviate, text)
+    text = _ISO_DATE.sub(lambda m: f"{int(m.group(2))}/{int(m.group(1))}", text)
+    text = _DAY_MONTH.sub(lambda m: f"{int(m.group(1))}/{int(m.group(2))}", text)
+    text = _HOUR.sub(r"\1:\2", text)
+    text = _KL.sub("kl", text)
+    text = _RANGE.sub("-", text)
+    text = _AREA_LIST.sub(_collapse_area_list, text)
+    text = _REPEAT.sub(r"\1", text)
+    text = _TAG_REPEAT.sub(r"\1:", text)
+    return " ".join(text.split())
+
+
+def compact_message(text: str) -> str:
+    """Compact rendered text before chunking when COMPACT is enabled, else return it unchanged."""
+    return compact(text) if config.COMPACT else text
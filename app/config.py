@@ -15,21 +15,97 @@ MESHTASTIC_HOP_LIMIT: int = int(os.getenv("MESHTASTIC_HOP_LIMIT", "5"))
 MESHTASTIC_MAX_BYTES: int = int(os.getenv("MESHTASTIC_MAX_BYTES", "200"))
 MESHTASTIC_MAX_MESSAGES: int = int(os.getenv("MESHTASTIC_MAX_MESSAGES", "2"))
 
+# Receive path: index packets other gateways put on the mesh and skip sending those again
+MESH_RECEIVE: bool = os.getenv("MESH_RECEIVE", "1") == "1"
+MESH_SEEN_TTL: float = float(os.getenv("MESH_SEEN_TTL", "3600"))  # seconds a seen packet ID suppresses our copy
+MESH_SEEN_MAX: int = int(os.getenv("MESH_SEEN_MAX", "4096"))
+MESH_LOAD_WINDOW: float = float(os.getenv("MESH_LOAD_WINDOW", "60"))  # seconds of observed airtime behind the channel load figure
+
+MESHTASTIC_MODEM_PRESET: str = os.getenv("MESHTASTIC_MODEM_PRESET", "MediumFast")  # used for airtime estimates
+
+# Transmit scheduling: airtime budget per channel, counted as packet airtime x (1 + hop limit)
+TX_AIRTIME_RATE: float = float(os.getenv("TX_AIRTIME_RATE", "0.1"))  # airtime seconds earned per second, 0 disables
+TX_AIRTIME_BURST: float = float(os.getenv("TX_AIRTIME_BURST", "60"))  # max airtime seconds that can be spent at once
+
+SEND_QUEUE_SIZE: int = int(os.getenv("SEND_QUEUE_SIZE", "256"))  # max queued outbound packets before producers wait
+SEND_FLUSH_TIMEOUT: int = int(os.getenv("SEND_FLUSH_TIMEOUT", "10"))  # seconds to drain the queue on shutdown
+
+# Shorten alert text before chunking (abbreviations, dates, area lists). Changes packet IDs: use the same setting on every node.
+COMPACT: bool = os.getenv("COMPACT", "0") == "1"
+
 MESHTASTIC_NODEINFO_INTERVAL: int = int(os.getenv("NODEINFO_INTERVAL_SECS", "43200"))  # 43200s / 12h default
 
 # Sources
 VMA_URL: str = os.getenv("VMA_URL", "https://vmaapi.sr.se/api/v3/alerts")
 VMA_INTERVAL: int = int(os.getenv("VMA_INTERVAL", "60"))
 VMA_GEOCODE: str = os.getenv("VMA_GEOCODE", "01")  # 01 is Stockholm
+VMA_MIN_INTERVAL: int = int(os.getenv("VMA_MIN_INTERVAL", "15"))  # fastest adaptive polling, while alerts change
+VMA_MAX_INTERVAL: int = int(os.getenv("VMA_MAX_INTERVAL", "60"))  # slowest adaptive polling, when quiet
 
 SMHI_URL: str = os.getenv("SMHI_URL", "https://opendata-download-warnings.smhi.se/ibww/api/version/1/warning.json")
 SMHI_INTERVAL: int = int(os.getenv("SMHI_INTERVAL", "60"))
+SMHI_MIN_INTERVAL: int = int(os.getenv("SMHI_MIN_INTERVAL", "30"))
+SMHI_MAX_INTERVAL: int = int(os.getenv("SMHI_MAX_INTERVAL", "300"))
 SMHI_GEOCODE: int = int(os.getenv("SMHI_GEOCODE", "1"))  # 1 is Stockholm, defined here https://opendata-download-warnings.smhi.se/ibww/api/version/1/metadata/area.json
+SMHI_STREAM: bool = os.getenv("SMHI_STREAM", "0") == "1"  # decode the feed incrementally, keeping only matching areas
+
+# Source plugins: builtin names or "package.module:ATTR" references, comma separated
+SOURCES: list[str] = [s.strip() for s in os.getenv("SOURCES", "vma,smhi").split(",") if s.strip()]
+SOURCE_ENTRY_POINTS: bool = os.getenv("SOURCE_ENTRY_POINTS", "0") == "1"  # also load installed "meshdaemon.sources" plugins (scans installed packages at startup)
+ADAPTIVE_POLL: bool = os.getenv("ADAPTIVE_POLL", "1") == "1"  # adapt intervals to activity and upstream cache headers
+POLL_BACKOFF: float = float(os.getenv("POLL_BACKOFF", "1.5"))  # interval growth per unchanged poll
+PARSE_WORKERS: list[str] = [s.strip().upper() for s in os.getenv("PARSE_WORKERS", "").split(",") if s.strip()]  # sources decoded and parsed in their own worker process
+SCHEDULE_JITTER: float = float(os.getenv("SCHEDULE_JITTER", "0.1"))  # +/- fraction of each interval, also max start offset
+
+# Shared HTTP client
+HTTP_LIMIT: int = int(os.getenv("HTTP_LIMIT", "10"))  # max open connections in total
+HTTP_LIMIT_PER_HOST: int = int(os.getenv("HTTP_LIMIT_PER_HOST", "2"))  # max open connections per upstream host
+HTTP_KEEPALIVE: float = float(os.getenv("HTTP_KEEPALIVE", "0"))  # idle keep-alive in seconds, 0 = longest poll interval + jitter
+HTTP_DNS_TTL: int = int(os.getenv("HTTP_DNS_TTL", "300"))  # seconds to cache DNS lookups
+HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # connection setup incl. TLS
+HTTP_READ_TIMEOUT: float = float(os.getenv("HTTP_READ_TIMEOUT", "10"))  # max gap between received chunks
+HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "15"))  # whole request
+
+# Optional multi-region routes (JSON list), see README. Empty = one route from the settings above.
+ROUTES: str = os.getenv("ROUTES", "")
 
 WARMUP: bool = os.getenv("WARMUP", "1") == "1"  # If true, suppress the first fetch after startup.
 
+# Sent-message ledger
+LEDGER_ENABLED: bool = os.getenv("LEDGER_ENABLED", "1") == "1"  # If true, skip messages that were already pushed.
+LEDGER_TTL: int = int(os.getenv("LEDGER_TTL", "86400"))  # forget a message after it has been absent this long (seconds)
+LEDGER_MAX_ENTRIES: int = int(os.getenv("LEDGER_MAX_ENTRIES", "4096"))
+
+# Persistent state (ledger, payload fingerprints, poll schedule) for warm restarts. Empty = in memory only.
+STATE_PATH: str = os.getenv("STATE_PATH", "")
+
+# Multi-node coordination: lease-based leader election over LAN multicast, only the leader polls and transmits
+COORDINATION: bool = os.getenv("COORDINATION", "0") == "1"
+COORD_GROUP: str = os.getenv("COORD_GROUP", MCAST_GRP)
+COORD_PORT: int = int(os.getenv("COORD_PORT", "4404"))  # separate from the Meshtastic port so nodes never see heartbeats
+COORD_HEARTBEAT: float = float(os.getenv("COORD_HEARTBEAT", "5"))  # seconds between heartbeats
+COORD_LEASE: float = float(os.getenv("COORD_LEASE", "15"))  # seconds without a leader heartbeat before a standby takes over
+COORD_PRIORITY: int = int(os.getenv("COORD_PRIORITY", "0"))  # higher is preferred when electing a new leader
+COORD_SCOPE: str = os.getenv("COORD_SCOPE", "")  # election scope, empty = derived from the configured routes
+COORD_SECRET: str = os.getenv("COORD_SECRET", "")  # optional shared secret to authenticate heartbeats
+
+# Prometheus metrics endpoint (/metrics), 0 disables
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST: str = os.getenv("METRICS_HOST", "0.0.0.0")
+HEALTH_MAX_AGE: float = float(os.getenv("HEALTH_MAX_AGE", "0"))  # seconds since a source's last successful fetch before /readyz fails, 0 = 3x its max interval
+
+# Logging
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (one object per line)
+LOG_QUEUE: bool = os.getenv("LOG_QUEUE", "1") == "1"  # write log lines from a background thread instead of the event loop
+LOG_SAMPLE_WINDOW: float = float(os.getenv("LOG_SAMPLE_WINDOW", "600"))  # seconds a repeated per-alert line is collapsed (and summary interval), 0 logs all
+
 MAX_RETRIES: int = int(os.getenv("MAX_RETRIES", "3"))  # perform 3 attempts
 BASE_BACKOFF: int = int(os.getenv("BASE_BACKOFF", "2"))  # base backoff in seconds
+RETRY_MAX_BACKOFF: float = float(os.getenv("RETRY_MAX_BACKOFF", "30"))  # cap of one jittered retry delay
+FETCH_BUDGET: float = float(os.getenv("FETCH_BUDGET", "30"))  # seconds one fetch may take incl. retries, 0 = unbounded
+CIRCUIT_FAILURES: int = int(os.getenv("CIRCUIT_FAILURES", "3"))  # failed fetches in a row that open an upstream's circuit, 0 disables
+CIRCUIT_RESET: float = float(os.getenv("CIRCUIT_RESET", "120"))  # seconds an open circuit skips fetches before probing
 
 MAX_RESTART_INTERVAL: int = int(os.getenv("MAX_RESTART_INTERVAL", "60"))  # restart throttling interval in seconds
 RESTART_HISTORY: int = int(os.getenv("RESTART_HISTORY", "5"))  # number of restarts in the interval to trigger stop
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import struct
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from . import config
+from . import metrics
+from .routes import Route
+
+log = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+
+# Max encoded heartbeat size: a datagram that fits a 1500-byte Ethernet MTU with IP/UDP headers to spare,
+# so heartbeats never fragment. The leader drops ledger keys beyond it; a standby that takes over without
+# a key re-sends that message, which the mesh firmware then dedupes by packet ID.
+_MAX_DATAGRAM = 1400
+
+# An unchanged leader state is re-applied this often, so a standby's ledger entries do not expire while
+# an alert stays active.
+_ADOPT_REFRESH = min(3600.0, config.LEDGER_TTL / 2)
+
+# Source fingerprints and ledger keys of the current messages, as published by the leader.
+LeaderState = tuple[dict[str, int], list[str]]
+
+
+def default_scope(routes: list[Route]) -> str:
+    """Election scope of a route set: nodes serving the same regions on the same channels elect one leader."""
+    return ";".join(sorted(f"{r.channel}/{r.vma_geocode or ''}/{r.smhi_geocode or ''}" for r in routes))
+
+
+@dataclass
+class _Peer:
+    priority: int
+    leader: bool
+    seen: float = field(default_factory=time.monotonic)
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, coordinator: Coordinator) -> None:
+        self.coordinator = coordinator
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self.coordinator._received(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        log.warning("[COORD] Socket error: %r", exc)
+
+
+class Coordinator:
+    """
+    Lease-based leader election among the nodes of one scope over LAN multicast.
+
+    Every node multicasts a heartbeat each `heartbeat` seconds. A leader holds
+    its lease as long as peers keep hearing it; once nothing has been heard
+    from a leader for `lease` seconds, the highest ranked live node
+    (`priority`, then instance id) takes over. A starting node listens for one
+    lease period before it may claim leadership, so it joins an existing
+    leader instead of competing with it. If two leaders meet (e.g. after a
+    network split heals), the lower ranked one steps down.
+
+    Only the leader polls and transmits. Its heartbeats carry each source's
+    payload fingerprint and the ledger keys of its current messages, so a
+    standby that takes over resumes where the leader stopped instead of
+    repeating what was already sent.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        group: str = config.COORD_GROUP,
+        port: int = config.COORD_PORT,
+        heartbeat: float = config.COORD_HEARTBEAT,
+        lease: float = config.COORD_LEASE,
+        priority: int = config.COORD_PRIORITY,
+        secret: str = config.COORD_SECRET,
+        leader_state: Callable[[], LeaderState] | None = None,
+        adopt: Callable[[dict[str, int], list[str]], None] | None = None,
+        on_promote: Callable[[], None] | None = None,
+    ) -> None:
+        self.scope = scope
+        self.group = group
+        self.port = port
+        self.heartbeat = heartbeat
+        self.lease = max(lease, heartbeat * 2)
+        self.priority = priority
+        self.instance = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.leader_state = leader_state
+        self.adopt = adopt
+        self.on_promote = on_promote
+        self._secret = secret.encode("utf-8")
+        self._peers: dict[str, _Peer] = {}
+        self._leader: str | None = None  # instance id of the leader we follow
+        self._adopted: tuple[dict[str, int], frozenset[str]] | None = None  # leader state last passed to adopt
+        self._adopted_at = 0.0
+        self._is_leader = False
+        metrics.COORD_ROLE.set(0)
+        metrics.COORD_PEERS.set_function(lambda: len(self._live_peers()))
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def standby(self) -> bool:
+        """True while another node holds the lease (or none has been elected yet)."""
+        return not self._is_leader
+
+    @staticmethod
+    def _rank(instance: str, priority: int) -> tuple[int, str]:
+        return priority, instance
+
+    def _live_peers(self) -> dict[str, _Peer]:
+        cutoff = time.monotonic() - self.lease
+        return {k: p for k, p in self._peers.items() if p.seen >= cutoff}
+
+    def _socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        mreq = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)  # peers on the same host
+        sock.setblocking(False)
+        return sock
+
+    def _sign(self, body: bytes) -> str:
+        return hmac.new(self._secret, body, hashlib.sha256).hexdigest()[:32]
+
+    def _encode(self) -> bytes:
+        msg: dict[str, Any] = {
+            "v": PROTOCOL_VERSION,
+            "scope": self.scope,
+            "id": self.instance,
+            "prio": self.priority,
+            "leader": self._is_leader,
+        }
+        if self._is_leader and self.leader_state is not None:
+            fingerprints, keys = self.leader_state()
+            msg["sources"] = fingerprints
+            msg["keys"] = keys
+        limit = _MAX_DATAGRAM - (33 if self._secret else 0)  # signature and separator
+        body = json.dumps(msg, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        while len(body) > limit and msg.get("keys"):
+            keys = msg["keys"]
+            drop = int((len(body) - limit) / (sum(len(k) + 3 for k in keys) / len(keys))) + 1
+            msg["keys"] = keys[:-drop]
+            body = json.dumps(msg, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        if self._secret:
+            return self._sign(body).encode("ascii") + b"." + body
+        return body
+
+    def _decode(self, data: bytes) -> dict[str, Any] | None:
+        if self._secret:
+            mac, _, data = data.partition(b".")
+            if not hmac.compare_digest(mac, self._sign(data).encode("ascii")):
+                return None
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return None
+        if not isinstance(msg, dict) or msg.get("v") != PROTOCOL_VERSION or msg.get("scope") != self.scope:
+            return None
+        if not isinstance(msg.get("id"), str) or not isinstance(msg.get("prio"), int):
+            return None
+        return msg
+
+    def _received(self, data: bytes, addr: tuple[str, int]) -> None:
+        msg = self._decode(data)
+        if msg is None or msg["id"] == self.instance:
+            return
+        instance, leader = msg["id"], bool(msg.get("leader"))
+        peer = self._peers.get(instance)
+        if peer is None:
+            log.info("[COORD] Peer joined: %s (%s, priority=%d)", instance, addr[0], msg["prio"])
+            peer = self._peers[instance] = _Peer(msg["prio"], leader)
+        peer.priority, peer.leader, peer.seen = msg["prio"], leader, time.monotonic()
+        if not leader:
+            return
+
+        if self._is_leader:
+            if self._rank(instance, peer.priority) > self._rank(self.instance, self.priority):
+                self._demote(f"outranked by {instance}")
+            return
+        if self._leader != instance:
+            self._leader = instance
+            self._adopted = None
+            log.info("[COORD] Following leader: %s", instance)
+        sources, keys = msg.get("sources"), msg.get("keys")
+        if self.adopt is None or not isinstance(sources, dict) or not isinstance(keys, list):
+            return
+        state = ({str(k): v for k, v in sources.items() if isinstance(v, int)}, frozenset(str(k) for k in keys))
+        now = time.monotonic()
+        if state == self._adopted and now - self._adopted_at < _ADOPT_REFRESH:
+            return  # nothing new since the last heartbeat
+        self._adopted, self._adopted_at = state, now
+        self.adopt(state[0], sorted(state[1]))
+
+    def _promote(self) -> None:
+        self._is_leader = True
+        self._leader = None
+        metrics.COORD_ROLE.set(1)
+        metrics.COORD_TRANSITIONS.inc(role="leader")
+        log.info("[COORD] Leadership acquired: %s (scope=%s, %d peers)", self.instance, self.scope, len(self._live_peers()))
+        if self.on_promote is not None:
+            self.on_promote()
+
+    def _demote(self, reason: str) -> None:
+        self._is_leader = False
+        metrics.COORD_ROLE.set(0)
+        metrics.COORD_TRANSITIONS.inc(role="standby")
+        log.warning("[COORD] Leadership released: %s (%s)", self.instance, reason)
+
+    def _tick(self, started: float) -> None:
+        live = self._live_peers()
+        for instance in set(self._peers) - set(live):
+            del self._peers[instance]
+            log.info("[COORD] Peer lost: %s (no heartbeat for %ss)", instance, self.lease)
+        if self._is_leader:
+            return
+        leaders = [k for k, p in live.items() if p.leader]
+        if leaders:
+            return
+        if self._leader is not None:
+            log.warning("[COORD] Leader lost: %s", self._leader)
+            self._leader = None
+        if time.monotonic() - started < self.lease:
+            return  # still discovering an existing leader
+        mine = self._rank(self.instance, self.priority)
+        if all(self._rank(k, p.priority) < mine for k, p in live.items()):
+            self._promote()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), sock=self._socket())
+        log.info(
+            "[COORD] Election started: %s (%s:%d, scope=%s, priority=%d, heartbeat=%ss, lease=%ss)",
+            self.instance, self.group, self.port, self.scope, self.priority, self.heartbeat, self.lease,
+        )
+        started = time.monotonic()
+        try:
+            while True:
+                self._tick(started)
+                try:
+                    transport.sendto(self._encode(), (self.group, self.port))
+                except OSError as exc:
+                    log.warning("[COORD] Heartbeat send failed: %r", exc)
+                await asyncio.sleep(self.heartbeat)
+        finally:
+            if self._is_leader:
+                self._demote("stopping")
+                try:
+                    transport.sendto(self._encode(), (self.group, self.port))  # lets a standby take over at once
+                except OSError:
+                    pass
+            transport.close()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+from . import config
+
+if TYPE_CHECKING:
+    from .coordination import Coordinator
+    from .scheduler import SourceScheduler
+    from .sender import Sender
+
+
+@dataclass
+class TaskHealth:
+    state: str  # running, restarting, failed, disabled or stopped
+    restarts: int = 0
+    since: float = field(default_factory=monotonic)
+
+
+def _age(ts: float | None, now: float) -> float | None:
+    return round(now - ts, 1) if ts is not None else None
+
+
+class Health:
+    """
+    Liveness and readiness of the daemon, assembled on request.
+
+    Supervised tasks report state changes here; everything else is read from
+    what the scheduler, sender and coordinator already keep (last successful
+    poll per source, last send, queue depth, role), so the hot path only ever
+    stores a timestamp.
+
+    Live: no supervised task has hit its restart limit (an optional task that
+    switched itself off is reported as disabled). Ready: live, the node
+    is set up, the sender is running, and every source had a successful fetch
+    within `max_age` seconds (default 3 x its longest poll interval). A
+    coordination standby is ready without polling: it is there to take over.
+    """
+
+    def __init__(self, max_age: float = config.HEALTH_MAX_AGE) -> None:
+        self.max_age = max_age
+        self.started = monotonic()
+        self.tasks: dict[str, TaskHealth] = {}
+        self.scheduler: SourceScheduler | None = None
+        self.sender: Sender | None = None
+        self.coordinator: Coordinator | None = None
+        self.node_ready: asyncio.Task[float] | None = None
+
+    def task(self, name: str, state: str, restarts: int | None = None) -> None:
+        entry = self.tasks.get(name)
+        if entry is None:
+            entry = self.tasks[name] = TaskHealth(state)
+        entry.state = state
+        entry.since = monotonic()
+        if restarts is not None:
+            entry.restarts = restarts
+
+    def _node(self) -> str:
+        task = self.node_ready
+        if task is None or not task.done():
+            return "pending"
+        return "ready" if not task.cancelled() and task.exception() is None else "failed"
+
+    def report(self) -> tuple[bool, bool, dict[str, Any]]:
+        """Return (live, ready, details)."""
+        now = monotonic()
+        reasons: list[str] = []
+        live = True
+        for name, entry in self.tasks.items():
+            if entry.state == "failed":
+                live = False
+                reasons.append(f"{name} failed")
+
+        node = self._node()
+        if node != "ready":
+            reasons.append(f"node {node}")
+        sender_task = self.tasks.get("task:sender")
+        if sender_task is None or sender_task.state != "running":
+            reasons.append("sender not running")
+
+        role = "single"
+        if self.coordinator is not None:
+            role = "leader" if self.coordinator.is_leader else "standby"
+
+        sources: dict[str, Any] = {}
+        if self.scheduler is not None:
+            for name, state in self.scheduler.states.items():
+                max_age = self.max_age or 3 * state.cadence.max_interval
+                since = state.last_success if state.last_success is not None else self.started
+                stale = now - since > max_age
+                if stale and role != "standby":
+                    reasons.append(f"{name} stale")
+                sources[name] = {
+                    "last_success_age": _age(state.last_success, now),
+                    "interval": state.cadence.current,
+                    "polls": state.polls,
+                    "failures": state.failures,
+                    "stale": stale,
+                }
+
+        sender: dict[str, Any] = {}
+        if self.sender is not None:
+            sender = {
+                "queue_depth": self.sender.depth,
+                "last_send_age": _age(self.sender.last_sent, now),
+                "sent": self.sender.sent,
+                "failed": self.sender.failed,
+                "skipped": self.sender.skipped,
+            }
+
+        ready = live and not reasons
+        details = {
+            "live": live,
+            "ready": ready,
+            "reasons": reasons,
+            "uptime": round(now - self.started, 1),
+            "role": role,
+            "node": node,
+            "tasks": {
+                name: {"state": t.state, "restarts": t.restarts, "since": round(now - t.since, 1)}
+                for name, t in self.tasks.items()
+            },
+            "sources": sources,
+            "sender": sender,
+        }
+        return live, ready, details
+
+
+HEALTH = Health()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from time import time
+
+from . import config
+
+
+class SentLedger:
+    """
+    Bounded, TTL-evicting record of messages that have already been pushed.
+
+    Keys are packet IDs, prefixed with the route name when routes are used.
+
+    Entries are kept in last-seen order: every poll that still carries an alert
+    refreshes its entry, so an alert is only forgotten once it has been absent
+    for `ttl` seconds. Timestamps are wall-clock so a snapshot persisted by the
+    state store stays valid across restarts.
+
+    A message is only recorded once it has been transmitted. While it waits in
+    the send queue it is `pending`, so later polls do not queue it again; if the
+    send fails it is released and the next poll retries it.
+    """
+
+    def __init__(self, ttl: int, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict[str, float] = OrderedDict()
+        self._dirty = False
+        self.pending: set[str] = set()  # queued for sending, not yet transmitted (never persisted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        ts = self._entries.get(key)
+        return ts is not None and time() - ts <= self.ttl
+
+    def touch(self, key: str) -> None:
+        """Insert or refresh a key, evicting expired and excess entries."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._dirty = True
+        self._entries[key] = time()
+        self._evict()
+
+    def settle(self, key: str, sent: bool) -> None:
+        """Resolve a pending key: record it if it was transmitted, release it for a retry if not."""
+        self.pending.discard(key)
+        if sent:
+            self.touch(key)
+
+    def _evict(self) -> None:
+        cutoff = time() - self.ttl
+        entries = self._entries
+        while entries:
+            oldest_id, oldest_ts = next(iter(entries.items()))
+            if oldest_ts >= cutoff and len(entries) <= self.max_entries:
+                break
+            del entries[oldest_id]
+
+    @property
+    def dirty(self) -> bool:
+        """True if keys were added since the last `mark_saved()`."""
+        return self._dirty
+
+    def mark_saved(self) -> None:
+        self._dirty = False
+
+    def snapshot(self) -> dict[str, float]:
+        """Entries as {key: wall-clock last seen}, oldest first."""
+        return {k: round(ts, 1) for k, ts in self._entries.items()}
+
+    def restore(self, raw: dict[str, object]) -> int:
+        """Replace the entries with a snapshot, dropping malformed and expired ones."""
+        items: list[tuple[str, float]] = []
+        for key, ts in raw.items():
+            try:
+                items.append((str(key), float(ts)))
+            except (TypeError, ValueError):
+                continue
+        self._entries = OrderedDict(sorted(items, key=lambda item: item[1]))
+        self._evict()
+        self._dirty = False
+        return len(self._entries)
+
+
+def from_config() -> SentLedger | None:
+    """Build the ledger described by config, or None if it is disabled."""
+    if not config.LEDGER_ENABLED:
+        return None
+    return SentLedger(config.LEDGER_TTL, config.LEDGER_MAX_ENTRIES)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import copy
+import json
+import logging
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from time import monotonic
+from typing import Any
+
+from . import config
+
+log = logging.getLogger(__name__)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Per-alert INFO lines that repeat while an alert stays active; matched against the format string.
+SAMPLED_LINES = ("Alert accepted",)
+
+_TAG = re.compile(r"\[([A-Z0-9_-]+)\]")
+
+# Set by setup() when sampling is enabled.
+sampler: RepeatSampler | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; the component tag is split out, the message text is kept as is."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        msg = record.getMessage()
+        tag = _TAG.match(msg)
+        entry: dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "tag": tag.group(1) if tag else None,
+            "msg": msg,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RepeatSampler(logging.Filter):
+    """
+    Collapses repeated per-alert lines.
+
+    A record whose format string contains one of `phrases` is keyed by its
+    fully rendered message, so the lines for different areas or routes of one
+    alert are kept apart. The first record of a key passes; repeats within
+    `window` seconds are dropped and counted for `summary()`, per alert (the
+    first argument).
+    """
+
+    def __init__(self, window: float, phrases: tuple[str, ...] = SAMPLED_LINES) -> None:
+        super().__init__()
+        self.window = window
+        self.phrases = phrases
+        self._last: dict[str, float] = {}
+        self._dropped: Counter[str] = Counter()
+        self._dropped_keys: dict[str, set[Any]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        msg = record.msg
+        if record.levelno > logging.INFO or not isinstance(msg, str):
+            return True
+        phrase = next((p for p in self.phrases if p in msg), None)
+        if phrase is None:
+            return True
+        key = record.getMessage()
+        now = monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last < self.window:
+            args = record.args
+            self._dropped[phrase] += 1
+            self._dropped_keys.setdefault(phrase, set()).add(args[0] if isinstance(args, tuple) and args else None)
+            return False
+        self._last[key] = now
+        return True
+
+    def summary(self) -> tuple[int, str] | None:
+        """Count and describe the lines dropped since the last call, then reset; None if there were none."""
+        cutoff = monotonic() - self.window
+        self._last = {k: ts for k, ts in self._last.items() if ts >= cutoff}
+        if not self._dropped:
+            return None
+        parts = ", ".join(
+            f"{phrase}: {n} for {len(self._dropped_keys.get(phrase, ()))} alerts"
+            for phrase, n in self._dropped.most_common()
+        )
+        total = sum(self._dropped.values())
+        self._dropped.clear()
+        self._dropped_keys.clear()
+        return total, parts
+
+
+class _QueueHandler(QueueHandler):
+    # Only merges the arguments on the calling thread; timestamps, levels and JSON are formatted by the listener.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup(
+    level: str = config.LOG_LEVEL,
+    fmt: str = config.LOG_FORMAT,
+    use_queue: bool = config.LOG_QUEUE,
+    sample_window: float = config.LOG_SAMPLE_WINDOW,
+) -> None:
+    """Configure the root logger: text or JSON lines on stdout, optionally written by a background thread."""
+    global sampler
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    handler: logging.Handler = stream
+    if use_queue:
+        queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+        handler = _QueueHandler(queue)
+        listener = QueueListener(queue, stream)
+        listener.start()
+        atexit.register(listener.stop)  # drains what is still queued
+
+    sampler = RepeatSampler(sample_window) if sample_window > 0 else None
+    if sampler is not None:
+        handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+
+async def summarize(interval: float = config.LOG_SAMPLE_WINDOW) -> None:
+    """Periodically log how many sampled lines were dropped."""
+    if sampler is None:
+        return
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            _log_summary()
+    finally:
+        _log_summary()
+
+
+def _log_summary() -> None:
+    dropped = sampler.summary() if sampler is not None else None
+    if dropped is not None:
+        log.info("[LOG] Repeated lines suppressed: %d (%s)", *dropped)
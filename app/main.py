@@ -2,17 +2,30 @@ from __future__ import annotations
 import asyncio
 import logging
 import signal
-import sys
 from typing import Awaitable, Callable
 from collections import deque
-from time import monotonic
+from functools import partial
+from time import monotonic, perf_counter
 
-import aiohttp
+_STARTED = perf_counter()  # taken before the app imports below, so they count towards startup
 
 from . import config
+from . import health
+from . import logs
+from . import metrics
 from . import udp
-from .util import send_message
-from .sources import vma, smhi
+from . import ledger as sent_ledger
+from . import routes
+from . import state as state_store
+from . import transport
+from .cadence import Cadence
+from .coordination import Coordinator, default_scope
+from .receiver import MeshReceiver
+from .scheduler import SourceScheduler
+from .sender import Sender
+from .sources.registry import load_sources
+
+_IMPORTED = perf_counter()
 
 MAX_RESTART_INTERVAL = config.MAX_RESTART_INTERVAL
 RESTART_HISTORY = config.RESTART_HISTORY
@@ -27,15 +40,19 @@ async def supervised_task(
     max_interval: int = MAX_RESTART_INTERVAL,
 ) -> None:
     start_times = deque(maxlen=restart_history)
+    restarts = 0
 
     while True:
         start_times.append(monotonic())
+        health.HEALTH.task(task_name, "running", restarts)
         try:
             await coro_func()
             log.info("[ASYNC] Task completed: %s", task_name)
+            health.HEALTH.task(task_name, "stopped")
             break
         except asyncio.CancelledError:
             log.info("[ASYNC] Task cancelled: %s", task_name)
+            health.HEALTH.task(task_name, "stopped")
             raise
         except Exception as exc:
             now = monotonic()
@@ -45,54 +62,190 @@ async def supervised_task(
                     "[ASYNC] Task restart limit reached: %s (%d failures in %ds)",
                     task_name, restart_history, max_interval,
                 )
+                health.HEALTH.task(task_name, "failed")
                 raise
             log.error("[ASYNC] Task crashed: %s (%r)", task_name, exc, exc_info=True)
+            metrics.TASK_RESTARTS.inc(task=task_name)
+            restarts += 1
+            health.HEALTH.task(task_name, "restarting", restarts)
             log.info("[ASYNC] Task restart scheduled in 5s: %s", task_name)
             await asyncio.sleep(5)
 
 
-async def nodeinfo_heartbeat(log: logging.Logger) -> None:
+async def announce(sender: Sender, log: logging.Logger) -> None:
+    """Send nodeinfo for every configured identity."""
+    for route in routes.identities():
+        try:
+            await sender.call(f"nodeinfo:{route.name}", partial(udp.send_nodeinfo, route), route=route)
+            log.info("[NODEINFO] Packet sent: %s", route.node_id)
+        except Exception as exc:
+            log.warning("[NODEINFO] Packet send failed: %s (%r)", route.node_id, exc)
+
+
+async def nodeinfo_heartbeat(
+    sender: Sender, log: logging.Logger, standby: Callable[[], bool] | None = None
+) -> None:
     log.info("[NODEINFO] Heartbeat started (interval=%ds)", config.MESHTASTIC_NODEINFO_INTERVAL)
     try:
         while True:
             await asyncio.sleep(config.MESHTASTIC_NODEINFO_INTERVAL)
-            try:
-                udp.send_nodeinfo()
-                log.info("[NODEINFO] Packet sent")
-            except Exception as exc:
-                log.warning("[NODEINFO] Packet send failed: %r", exc)
+            if standby is not None and standby():
+                continue
+            await announce(sender, log)
     except asyncio.CancelledError:
         log.info("[NODEINFO] Heartbeat stopped")
         raise
 
 
-async def main() -> None:
-    logging.basicConfig(
-        level=logging.INFO,
-        stream=sys.stdout,
-        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
-    )
+async def receive(receiver: MeshReceiver, sender: Sender, log: logging.Logger) -> None:
+    """
+    Run the mesh receiver under supervision. It only saves airtime, so when it
+    reaches its restart limit it is switched off and the daemon keeps sending.
+    """
+    try:
+        await supervised_task("task:receiver", receiver.run, log)
+    except Exception as exc:
+        sender.receiver = None
+        health.HEALTH.task("task:receiver", "disabled")
+        log.warning("[UDP] Receiver disabled: %r; sending without checking the mesh for carried packets", exc)
+
 
+def _setup_node() -> None:
     udp.setup_node()
-    udp.send_nodeinfo()
+    if not config.COORDINATION:
+        # With coordination, nodeinfo goes out once this node is elected leader.
+        for route in routes.identities():
+            udp.send_nodeinfo(route)
+
+
+async def node_setup(sender: Sender, log: logging.Logger) -> float:
+    """Set up the multicast node on the sender's worker thread; returns how long it took."""
+    started = perf_counter()
+    try:
+        await sender.prepare(_setup_node)
+    except Exception as exc:
+        log.error("[UDP] Node setup failed: %r", exc)
+        raise
+    return perf_counter() - started
+
+
+async def report_startup(
+    phases: list[tuple[str, float]],
+    scheduler: SourceScheduler,
+    node_ready: asyncio.Task[float],
+    log: logging.Logger,
+) -> None:
+    """Log how long each startup phase took, once polling is scheduled and the node is set up."""
+    since = perf_counter()
+    await scheduler.started.wait()
+    phases.append(("scheduler", perf_counter() - since))
+    polling = perf_counter() - _STARTED
+    node = await asyncio.gather(node_ready, return_exceptions=True)
+    log.info(
+        "[ASYNC] Startup phases: %s node=%s (polling after %.0fms)",
+        " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in phases),
+        f"{node[0] * 1000:.0f}ms" if isinstance(node[0], float) else "failed",
+        polling * 1000,
+    )
+
+
+async def main() -> None:
+    logs.setup()
+
+    phases = [("imports", _IMPORTED - _STARTED)]
+    mark = perf_counter()
+    log.info("[ASYNC] Routes configured: %s", ", ".join(r.name for r in routes.ROUTES))
+
+    receiver = MeshReceiver() if config.MESH_RECEIVE else None
+    sender = Sender(receiver=receiver)
+    # mudp is imported once on the sender's worker thread while the daemon is configured; polling
+    # waits for it, since a concurrent protobuf import on the loop would corrupt the descriptor pool.
+    # Multicast setup and the first nodeinfo follow on the same thread while the sources poll;
+    # packets queue behind them.
+    mudp_loaded = sender.prepare(udp.load)
+    node_ready = asyncio.create_task(node_setup(sender, log), name="task:node-setup")
+
+    stop_evt = asyncio.Event()
+    node_ready.add_done_callback(lambda t: t.cancelled() or t.exception() is None or stop_evt.set())
 
-    async with aiohttp.ClientSession() as session:
-        t_vma = asyncio.create_task(
-            supervised_task("src:vma", lambda: vma.run(session, warmup=config.WARMUP, push=send_message), log),
-            name="src:vma",
+    ledger = sent_ledger.from_config()
+    store = state_store.from_config(ledger)
+    specs = load_sources(config.SOURCES, use_entry_points=config.SOURCE_ENTRY_POINTS)
+    metrics_runner = await metrics.start_server() if config.METRICS_PORT else None
+    coordinator = Coordinator(config.COORD_SCOPE or default_scope(routes.ROUTES)) if config.COORDINATION else None
+    background: set[asyncio.Task[None]] = set()
+    workers = {}
+    if config.PARSE_WORKERS:
+        from .workers import ParseWorker  # multiprocessing is only loaded when a source is isolated
+
+        workers = {spec.name: ParseWorker(spec) for spec in specs if spec.name.upper() in config.PARSE_WORKERS}
+    phases.append(("config", perf_counter() - mark))
+    mark = perf_counter()
+
+    # Keep-alive outlasts the longest gap between polls, up to the adaptive maximum of quiet sources.
+    longest = [Cadence(spec.interval, spec.min_interval, spec.max_interval).longest for spec in specs]
+    async with transport.create_session(longest) as session:
+        phases.append(("session", perf_counter() - mark))
+        mark = perf_counter()
+        await mudp_loaded
+        phases.append(("mudp", perf_counter() - mark))
+        scheduler = SourceScheduler(
+            specs, session, push=sender.push, ledger=ledger, warmup=config.WARMUP, store=store,
+            standby=coordinator.standby if coordinator is not None else None,
+            workers=workers,
         )
-        t_smhi = asyncio.create_task(
-            supervised_task("src:smhi", lambda: smhi.run(session, warmup=config.WARMUP, push=send_message), log),
-            name="src:smhi",
+        health.HEALTH.scheduler = scheduler
+        health.HEALTH.sender = sender
+        health.HEALTH.coordinator = coordinator
+        health.HEALTH.node_ready = node_ready
+        report = asyncio.create_task(report_startup(phases, scheduler, node_ready, log), name="task:startup-report")
+        background.add(report)
+        report.add_done_callback(background.discard)
+        t_src = asyncio.create_task(
+            supervised_task("task:scheduler", scheduler.run, log),
+            name="task:scheduler",
         )
         t_hb = asyncio.create_task(
-            supervised_task("task:nodeinfo", lambda: nodeinfo_heartbeat(log), log),
+            supervised_task(
+                "task:nodeinfo",
+                lambda: nodeinfo_heartbeat(sender, log, coordinator.standby if coordinator is not None else None),
+                log,
+            ),
             name="task:nodeinfo",
         )
+        t_tx = asyncio.create_task(
+            supervised_task("task:sender", sender.run, log),
+            name="task:sender",
+        )
+
+        tasks = [t_src, t_hb]
+        if receiver is not None:
+            # Optional: a receiver that keeps failing disables itself instead of stopping the daemon.
+            t_rx = asyncio.create_task(receive(receiver, sender, log), name="task:receiver")
+            background.add(t_rx)
+            t_rx.add_done_callback(background.discard)
 
-        tasks = [t_vma, t_smhi, t_hb]
+        if logs.sampler is not None:
+            tasks.append(asyncio.create_task(
+                supervised_task("task:log-summary", logs.summarize, log),
+                name="task:log-summary",
+            ))
+
+        if coordinator is not None:
+            def on_promote() -> None:
+                scheduler.poll_now()
+                task = asyncio.create_task(announce(sender, log), name="task:announce")
+                background.add(task)
+                task.add_done_callback(background.discard)
+
+            coordinator.leader_state = scheduler.leader_state
+            coordinator.adopt = scheduler.adopt
+            coordinator.on_promote = on_promote
+            tasks.append(asyncio.create_task(
+                supervised_task("task:coordination", coordinator.run, log),
+                name="task:coordination",
+            ))
 
-        stop_evt = asyncio.Event()
         loop = asyncio.get_running_loop()
         for sig in (signal.SIGINT, signal.SIGTERM):
             try:
@@ -101,7 +254,7 @@ async def main() -> None:
                 signal.signal(sig, lambda *_: stop_evt.set())
 
         stop_waiter = asyncio.create_task(stop_evt.wait(), name="task:stop-waiter")
-        done, _ = await asyncio.wait([*tasks, stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+        done, _ = await asyncio.wait([*tasks, t_tx, stop_waiter], return_when=asyncio.FIRST_COMPLETED)
 
         if stop_waiter not in done:
             for completed in done:
@@ -114,11 +267,28 @@ async def main() -> None:
                     log.error("[ASYNC] Task failed: %s (%r)", completed.get_name(), exc)
             stop_evt.set()
 
-        for t in tasks:
+        for t in [*tasks, *background]:
             t.cancel()
         stop_waiter.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*tasks, *background, return_exceptions=True)
         await asyncio.gather(stop_waiter, return_exceptions=True)
+        await asyncio.gather(node_ready, return_exceptions=True)
+
+        # Producers are stopped; let the sender drain what is already queued.
+        if not t_tx.done():
+            await sender.flush()
+        t_tx.cancel()
+        await asyncio.gather(t_tx, return_exceptions=True)
+        # Saved after the flush, so the ledger holds only messages that actually went out.
+        if store is not None:
+            store.save(force=True)
+        sender.close()
+        for worker in workers.values():
+            worker.close()
+
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    node_ready.result()  # a failed node setup still exits non-zero
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import bisect
+import logging
+from collections.abc import Callable
+from typing import Any
+
+from . import config
+from .health import HEALTH
+
+log = logging.getLogger(__name__)
+
+_registry: list[_Metric] = []
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_BYTES_BUCKETS = (1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")).replace("\\", "\\\\").replace('"', '\\"') for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._functions: dict[tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, func: Callable[[], float], **labels: Any) -> None:
+        """Read the value from `func` at scrape time instead of updating it on the hot path."""
+        self._functions[self._key(labels)] = func
+
+    def samples(self) -> list[str]:
+        values = dict(self._values)
+        for key, func in self._functions.items():
+            values[key] = func()
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def samples(self) -> list[str]:
+        lines: list[str] = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(self._sums[key])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return "".join(metric.render() for metric in _registry)
+
+
+# Fetch / parse
+FETCH_SECONDS = Histogram(
+    "meshdaemon_fetch_seconds", "HTTP request latency per attempt.", ("source", "outcome"),
+)
+FETCH_RETRIES = Counter("meshdaemon_fetch_retries_total", "HTTP attempts that failed and were retried.", ("source",))
+FETCH_FAILURES = Counter("meshdaemon_fetch_failures_total", "Fetches that failed after all attempts.", ("source",))
+HTTP_CONNECTIONS = Counter(
+    "meshdaemon_http_connections_total", "Requests by connection use (reused from the pool or new).",
+    ("source", "connection"),
+)
+PAYLOAD_BYTES = Histogram(
+    "meshdaemon_payload_bytes", "Response body size of full (non-304) payloads.", ("source",), buckets=_BYTES_BUCKETS,
+)
+PARSE_SECONDS = Histogram("meshdaemon_parse_seconds", "Time spent turning a payload into messages.", ("source",))
+ALERT_CHUNKS = Histogram(
+    "meshdaemon_alert_chunks", "Chunks produced per rendered alert.", ("source",),
+    buckets=tuple(float(n) for n in range(1, max(config.MESHTASTIC_MAX_MESSAGES, 1) + 1)),
+)
+
+CIRCUIT_STATE = Gauge(
+    "meshdaemon_circuit_state", "Circuit breaker state per upstream host (0 closed, 1 half-open, 2 open).", ("upstream",),
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "meshdaemon_circuit_transitions_total", "Circuit breaker state changes, by new state.", ("upstream", "state"),
+)
+FETCH_SKIPPED = Counter("meshdaemon_fetch_skipped_total", "Fetches skipped because the upstream circuit was open.", ("source",))
+
+POLL_INTERVAL = Gauge("meshdaemon_poll_interval_seconds", "Current (adaptive) poll interval.", ("source",))
+
+# Push / send
+MESSAGES = Counter(
+    "meshdaemon_messages_total", "Messages produced by polls, by outcome (pushed or suppressed).", ("source", "outcome"),
+)
+PACKETS = Counter("meshdaemon_packets_total", "Packets handled by the sender, by outcome (sent, failed, or skipped as already on the mesh).", ("outcome",))
+SEND_SECONDS = Histogram("meshdaemon_send_seconds", "Time to encode, encrypt and write one packet.")
+QUEUE_WAIT_SECONDS = Histogram(
+    "meshdaemon_send_queue_wait_seconds", "Time packets spent queued before sending.", ("priority",),
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+QUEUE_DEPTH = Gauge("meshdaemon_send_queue_depth", "Packets currently queued.")
+
+# Mesh receive path
+MESH_PACKETS = Counter(
+    "meshdaemon_mesh_packets_total", "Packets received from the multicast group, by outcome (unique, duplicate, own, invalid).",
+    ("outcome",),
+)
+MESH_AIRTIME = Counter("meshdaemon_mesh_airtime_seconds_total", "Estimated airtime of unique packets seen on the mesh.")
+MESH_CHANNEL_LOAD = Gauge("meshdaemon_mesh_channel_load", "Share of recent airtime used by observed packets (0-1).")
+
+# Coordination
+COORD_ROLE = Gauge("meshdaemon_coordination_leader", "1 while this node holds the leader lease, else 0.")
+COORD_PEERS = Gauge("meshdaemon_coordination_peers", "Peers heard within the lease period.")
+COORD_TRANSITIONS = Counter("meshdaemon_coordination_transitions_total", "Role changes, by new role.", ("role",))
+
+# Tasks
+TASK_RESTARTS = Counter("meshdaemon_task_restarts_total", "Supervised task restarts after a crash.", ("task",))
+
+
+async def start_server(host: str = config.METRICS_HOST, port: int = config.METRICS_PORT) -> Any:
+    """Serve /metrics over HTTP. Returns the aiohttp AppRunner (call cleanup() on shutdown)."""
+    from aiohttp import web
+
+    async def handle_metrics(_request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    async def handle_health(request: web.Request) -> web.Response:
+        live, ready, details = HEALTH.report()
+        ok = ready if request.path == "/readyz" else live
+        return web.json_response(details, status=200 if ok else 503)
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/readyz", handle_health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("[METRICS] Server started: http://%s:%d/metrics (health: /healthz, /readyz)", host, port)
+    return runner
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import socket
+import struct
+from collections import OrderedDict, deque
+from time import monotonic
+
+from . import config
+from . import metrics
+from .airtime import packet_airtime
+
+log = logging.getLogger(__name__)
+
+# A packet on the mesh, as firmware dedupe sees it across gateways: (channel hash, packet ID).
+PacketKey = tuple[int, int]
+
+
+class SeenIndex:
+    """Bounded, TTL-evicting set of packet keys, oldest first."""
+
+    def __init__(self, ttl: float = config.MESH_SEEN_TTL, max_entries: int = config.MESH_SEEN_MAX) -> None:
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict[PacketKey, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: PacketKey) -> bool:
+        ts = self._entries.get(key)
+        return ts is not None and monotonic() - ts <= self.ttl
+
+    def add(self, key: PacketKey) -> bool:
+        """Record a key; returns False if it was already present (a duplicate)."""
+        fresh = key not in self
+        self._entries[key] = monotonic()
+        self._entries.move_to_end(key)
+        cutoff = monotonic() - self.ttl
+        entries = self._entries
+        while entries:
+            oldest, ts = next(iter(entries.items()))
+            if ts >= cutoff and len(entries) <= self.max_entries:
+                break
+            del entries[oldest]
+        return fresh
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver: MeshReceiver) -> None:
+        self.receiver = receiver
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self.receiver.handle(data)
+
+    def error_received(self, exc: Exception) -> None:
+        log.warning("[UDP] Receive error: %r", exc)
+
+
+class MeshReceiver:
+    """
+    Listens on the Meshtastic multicast group and indexes the packets other
+    gateways put on the mesh.
+
+    Only the cleartext MeshPacket header (channel hash, packet ID) is read;
+    payloads are never decrypted. Packets this daemon sent itself (registered
+    via `own()`) are recognised when they echo back and kept out of the index.
+    The Sender consults `carried()` right before transmitting and skips
+    packets the mesh already has. Every unique packet's estimated airtime
+    feeds a sliding-window channel load figure.
+    """
+
+    def __init__(
+        self,
+        group: str = config.MCAST_GRP,
+        port: int = config.MCAST_PORT,
+        load_window: float = config.MESH_LOAD_WINDOW,
+    ) -> None:
+        self.group = group
+        self.port = port
+        self.load_window = load_window
+        self.seen = SeenIndex()
+        self._own = SeenIndex()
+        self._airtime: deque[tuple[float, float]] = deque()  # (monotonic, airtime seconds) of unique packets
+        self.received = 0
+        metrics.MESH_CHANNEL_LOAD.set_function(self.channel_load)
+
+    def own(self, key: PacketKey) -> None:
+        """Register a packet this daemon is about to send, so its echo is not mistaken for another gateway's."""
+        self._own.add(key)
+
+    def carried(self, key: PacketKey) -> bool:
+        """True if another gateway already put this packet on the mesh."""
+        return key in self.seen
+
+    def channel_load(self) -> float:
+        """Fraction of the last `load_window` seconds of airtime taken by observed packets."""
+        cutoff = monotonic() - self.load_window
+        airtime = self._airtime
+        while airtime and airtime[0][0] < cutoff:
+            airtime.popleft()
+        return sum(a for _, a in airtime) / self.load_window if self.load_window > 0 else 0.0
+
+    def handle(self, data: bytes) -> None:
+        """Index one received datagram."""
+        from google.protobuf.message import DecodeError
+        from meshtastic.protobuf import mesh_pb2
+
+        self.received += 1
+        packet = mesh_pb2.MeshPacket()
+        try:
+            packet.ParseFromString(data)
+        except DecodeError:
+            metrics.MESH_PACKETS.inc(outcome="invalid")
+            return
+        if not packet.id:
+            metrics.MESH_PACKETS.inc(outcome="invalid")
+            return
+        key = (packet.channel, packet.id)
+        if key in self._own:
+            metrics.MESH_PACKETS.inc(outcome="own")
+            return
+        if not self.seen.add(key):
+            metrics.MESH_PACKETS.inc(outcome="duplicate")
+            return
+        metrics.MESH_PACKETS.inc(outcome="unique")
+        size = len(packet.encrypted) if packet.encrypted else packet.decoded.ByteSize()
+        airtime = packet_airtime(size)
+        self._airtime.append((monotonic(), airtime))
+        metrics.MESH_AIRTIME.inc(airtime)
+        log.debug(
+            "[UDP] Packet observed: %08x from !%08x (channel %d, %.2fs airtime)",
+            packet.id, getattr(packet, "from"), packet.channel, airtime,
+        )
+
+    def _socket(self) -> socket.socket:
+        # A socket of our own: mudp's stays blocking and send-only on its worker thread.
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("", self.port))
+        mreq = struct.pack("4s4s", socket.inet_aton(self.group), socket.inet_aton("0.0.0.0"))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        sock.setblocking(False)
+        return sock
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(self), sock=self._socket())
+        log.info(
+            "[UDP] Receiver started: %s:%d (seen ttl=%ss, max=%d)",
+            self.group, self.port, self.seen.ttl, self.seen.max_entries,
+        )
+        try:
+            await asyncio.Future()  # runs until cancelled
+        finally:
+            transport.close()
+            log.info(
+                "[UDP] Receiver stopped: %d datagrams, %d packets indexed, channel load %.1f%%",
+                self.received, len(self.seen), self.channel_load() * 100,
+            )
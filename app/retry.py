@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from . import config
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# Client errors worth another attempt; any other 4xx will not change on retry.
+_RETRYABLE_4XX = frozenset({408, 425, 429})
+
+
+class RetryPolicy:
+    """
+    How one fetch retries: up to `max_attempts` attempts, spaced by decorrelated
+    jitter (each delay is drawn from [base, 3 x previous delay], capped at `cap`)
+    and bounded by a `budget` of seconds for the whole fetch, waits included.
+
+    The jitter keeps a fleet of nodes that failed together from retrying
+    together.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = config.MAX_RETRIES,
+        base: float = config.BASE_BACKOFF,
+        cap: float = config.RETRY_MAX_BACKOFF,
+        budget: float = config.FETCH_BUDGET,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.max_attempts = max(1, max_attempts)
+        self.base = max(0.0, base)
+        self.cap = max(self.base, cap)
+        self.budget = budget
+        self._rng = rng or random.Random()
+
+    def next_delay(self, previous: float | None) -> float:
+        """Delay before the next attempt, given the delay before the last one (None after the first attempt)."""
+        if previous is None:
+            previous = self.base
+        return min(self.cap, self._rng.uniform(self.base, max(self.base, previous * 3)))
+
+    @staticmethod
+    def retryable(exc: BaseException) -> bool:
+        """Whether another attempt can succeed after `exc`."""
+        if isinstance(exc, aiohttp.ClientResponseError):
+            return exc.status >= 500 or exc.status in _RETRYABLE_4XX
+        return isinstance(exc, (aiohttp.ClientError, asyncio.TimeoutError))
+
+    def deadline(self) -> float | None:
+        """Monotonic time by which the fetch must finish, or None without a budget."""
+        return time.monotonic() + self.budget if self.budget > 0 else None
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream host, kept across poll cycles.
+
+    closed: requests flow; `threshold` failed fetches in a row open the circuit.
+    open: fetches are skipped without touching the network for `reset_timeout`
+        seconds.
+    half-open: one fetch with a single attempt probes the upstream; success
+        closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self, upstream: str, threshold: int = config.CIRCUIT_FAILURES, reset_timeout: float = config.CIRCUIT_RESET
+    ) -> None:
+        self.upstream = upstream
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        metrics.CIRCUIT_STATE.set(0, upstream=upstream)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def allow(self) -> bool:
+        """Whether a fetch may go out now; moves an expired open circuit to half-open."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._transition(self.HALF_OPEN)
+        return True
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through."""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def success(self) -> None:
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def failure(self) -> None:
+        if not self.enabled:
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            if self.state != self.OPEN:
+                self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self.state = self.state, state
+        metrics.CIRCUIT_STATE.set(self._GAUGE[state], upstream=self.upstream)
+        metrics.CIRCUIT_TRANSITIONS.inc(upstream=self.upstream, state=state)
+        if state == self.OPEN:
+            log.warning(
+                "[HTTP] Circuit opened: %s (%d failed fetches, probing again in %ss)",
+                self.upstream, self.failures, self.reset_timeout,
+            )
+        else:
+            log.info("[HTTP] Circuit %s: %s (was %s)", "closed" if state == self.CLOSED else "half-open",
+                     self.upstream, previous)
+
+
+# One breaker per upstream host, shared by every source and route that fetches from it.
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker_for(url: str) -> CircuitBreaker:
+    """The circuit breaker of the host serving `url`."""
+    upstream = urlsplit(url).netloc or url
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        breaker = _breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
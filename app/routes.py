@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+
+from . import config
+
+
+@dataclass(frozen=True)
+class Route:
+    """A region served by this daemon and the mesh identity its alerts are sent with."""
+    name: str
+    vma_geocode: str | None
+    smhi_geocode: int | None
+    channel: str
+    key: str
+    node_id: str
+    long_name: str
+    short_name: str
+
+    @property
+    def identity(self) -> tuple[str, str, str]:
+        return self.node_id, self.channel, self.key
+
+
+def _default_route() -> Route:
+    return Route(
+        name="default",
+        vma_geocode=config.VMA_GEOCODE or None,
+        smhi_geocode=config.SMHI_GEOCODE,
+        channel=config.MESHTASTIC_CHANNEL,
+        key=config.MESHTASTIC_KEY,
+        node_id=config.MESHTASTIC_NODE_ID,
+        long_name=config.MESHTASTIC_LONG_NAME,
+        short_name=config.MESHTASTIC_SHORT_NAME,
+    )
+
+
+def parse_routes(raw: str) -> list[Route]:
+    """
+    Parse the ROUTES setting: a JSON list of objects with a "name" and any of
+    vma_geocode, smhi_geocode, channel, key, node_id, long_name, short_name.
+    Missing fields fall back to the single-route settings. An empty value
+    yields the single default route.
+    """
+    if not raw.strip():
+        return [_default_route()]
+
+    items = json.loads(raw)
+    if not isinstance(items, list) or not items:
+        raise ValueError("ROUTES must be a non-empty JSON list")
+
+    base = _default_route()
+    routes: list[Route] = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"ROUTES[{idx}] must be an object")
+        smhi_geocode = item.get("smhi_geocode")
+        vma_geocode = item.get("vma_geocode")
+        routes.append(Route(
+            name=str(item.get("name") or f"route{idx}"),
+            vma_geocode=str(vma_geocode) if vma_geocode not in (None, "") else None,
+            smhi_geocode=int(smhi_geocode) if smhi_geocode not in (None, "") else None,
+            channel=str(item.get("channel", base.channel)),
+            key=str(item.get("key", base.key)),
+            node_id=str(item.get("node_id", base.node_id)),
+            long_name=str(item.get("long_name", base.long_name)),
+            short_name=str(item.get("short_name", base.short_name)),
+        ))
+
+    names = [r.name for r in routes]
+    if len(set(names)) != len(names):
+        raise ValueError("ROUTES names must be unique")
+    return routes
+
+
+ROUTES: list[Route] = parse_routes(config.ROUTES)
+
+
+def identities() -> list[Route]:
+    """One route per distinct (node id, channel, key), for nodeinfo broadcasts."""
+    seen: set[tuple[str, str, str]] = set()
+    out: list[Route] = []
+    for route in ROUTES:
+        if route.identity not in seen:
+            seen.add(route.identity)
+            out.append(route)
+    return out
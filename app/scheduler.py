@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+import aiohttp
+
+from . import config
+from . import metrics
+from .ledger import SentLedger
+from .sources.common import Push, SourceState, ledger_key, poll_source
+from .state import StateStore
+from .sources.registry import SourceSpec
+
+if TYPE_CHECKING:
+    from .workers import ParseWorker
+
+log = logging.getLogger(__name__)
+
+
+class SourceScheduler:
+    """
+    Drives every registered source from a single timer heap.
+
+    Each source gets a random start offset and a jittered interval so polls of
+    different sources (and of different nodes) do not line up. The interval
+    itself comes from the source's Cadence and is set when its poll finishes. Polls run as
+    their own tasks, so a slow upstream never delays another source; a source
+    whose previous poll is still running skips that slot.
+
+    With a state store, sources that have a persisted record resume instead of
+    warming up, keep their saved poll schedule, and the state is saved after
+    every poll.
+
+    With a `standby` check (see coordination.Coordinator), slots that come due
+    while it returns True are skipped: another node polls for this one.
+
+    Sources with a ParseWorker in `workers` (keyed by source name) decode and
+    parse their payloads in that worker's process.
+    """
+
+    def __init__(
+        self,
+        specs: list[SourceSpec],
+        session: aiohttp.ClientSession,
+        push: Push,
+        ledger: SentLedger | None,
+        warmup: bool,
+        jitter: float = config.SCHEDULE_JITTER,
+        store: StateStore | None = None,
+        standby: Callable[[], bool] | None = None,
+        workers: dict[str, ParseWorker] | None = None,
+    ) -> None:
+        self.states = {spec.name: SourceState(spec) for spec in specs}
+        for name, worker in (workers or {}).items():
+            self.states[name].worker = worker
+        self.session = session
+        self.push = push
+        self.ledger = ledger
+        self.warmup = warmup
+        self.jitter = max(0.0, min(jitter, 0.5))
+        self.store = store
+        self.standby = standby
+        self.started = asyncio.Event()  # set once every source has its first poll scheduled
+        self._running: dict[str, asyncio.Task[None]] = {}
+        self._heap: list[tuple[float, int, int, SourceState]] = []
+        self._seq = itertools.count()
+        self._current: dict[str, int] = {}  # source -> seq of its live heap entry
+        self._wake = asyncio.Event()
+
+        if store is not None and store.loaded:
+            for name, state in self.states.items():
+                rec = store.sources.get(name)
+                if rec is not None:
+                    state.fingerprint = rec.fingerprint
+                    state.resume = True
+
+    def _jittered(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule(self, state: SourceState, due: float) -> None:
+        """(Re)schedule a source's next poll at loop time `due`, replacing any earlier entry."""
+        loop = asyncio.get_running_loop()
+        seq = next(self._seq)
+        self._current[state.spec.name] = seq
+        heapq.heappush(self._heap, (due, state.spec.priority, seq, state))
+        self._wake.set()
+        if self.store is not None:
+            self.store.record(state.spec.name, next_poll=time.time() + (due - loop.time()))
+
+    async def _poll(self, state: SourceState, due: float) -> None:
+        name = state.spec.name
+        try:
+            await poll_source(self.session, state, self.push, self.ledger, self.warmup, log)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            state.failures += 1
+            log.error("[%s] Poll failed: %r", name, exc, exc_info=True)
+
+        previous = state.cadence.current
+        interval = state.cadence.update(
+            changed=state.changed, active=state.active,
+            fresh_for=state.meta.fresh_for, retry_in=state.meta.retry_in,
+        )
+        metrics.POLL_INTERVAL.set(interval, source=name)
+        if abs(interval - previous) >= 1:
+            log.info("[%s] Poll interval changed: %.0fs -> %.0fs (%s)", name, previous, interval, state.cadence.reason)
+        self._schedule(state, max(due + self._jittered(interval), asyncio.get_running_loop().time()))
+
+        if self.store is not None:
+            self.store.record(name, fingerprint=state.fingerprint)
+            self.store.save()
+
+    def leader_state(self) -> tuple[dict[str, int], list[str]]:
+        """Each source's payload fingerprint and the ledger keys of its current messages that were sent."""
+        fingerprints: dict[str, int] = {}
+        keys: list[str] = []
+        ledger = self.ledger
+        for name, state in self.states.items():
+            if state.fingerprint is None:
+                continue
+            fingerprints[name] = state.fingerprint
+            keys.extend(k for k in map(ledger_key, state.last_msgs) if ledger is None or k in ledger)
+        return fingerprints, keys
+
+    def adopt(self, fingerprints: dict[str, int], keys: list[str]) -> None:
+        """
+        Take over what the leader last processed, so that after a failover the
+        first poll resumes instead of warming up or repeating sent messages.
+        """
+        if self.ledger is not None:
+            for key in keys:
+                self.ledger.touch(key)
+        for name, fingerprint in fingerprints.items():
+            state = self.states.get(name)
+            if state is None:
+                continue
+            state.fingerprint = fingerprint
+            state.resume = True
+            if self.store is not None:
+                self.store.record(name, fingerprint=fingerprint)
+        if self.store is not None:
+            self.store.save()
+
+    def poll_now(self) -> None:
+        """Make every source due immediately (e.g. right after this node became leader)."""
+        now = asyncio.get_running_loop().time()
+        for state in self.states.values():
+            self._schedule(state, now + random.uniform(0, 1))
+
+    def _start_offset(self, state: SourceState) -> float:
+        """Delay before a source's first poll: its saved schedule if any, else a random offset."""
+        rec = self.store.sources.get(state.spec.name) if self.store is not None and self.store.loaded else None
+        if rec is not None and rec.next_poll is not None and not state.polls:
+            return max(0.0, min(rec.next_poll - time.time(), state.cadence.max_interval))
+        return random.uniform(0, self.jitter * state.spec.interval)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._heap = []
+        self._current = {}
+        now = loop.time()
+        for state in self.states.values():
+            spec = state.spec
+            offset = self._start_offset(state)
+            self._schedule(state, now + offset)
+            metrics.POLL_INTERVAL.set(state.cadence.current, source=spec.name)
+            log.info(
+                "[%s] Source started (%s, interval=%ds, first poll in %.0fs)",
+                spec.name, "resume" if state.resume else f"warmup={self.warmup}", spec.interval, offset,
+            )
+        self.started.set()
+
+        try:
+            while True:
+                heap = self._heap
+                while heap and heap[0][2] != self._current.get(heap[0][3].spec.name):
+                    heapq.heappop(heap)  # superseded by a reschedule
+                if not heap:
+                    return
+                due, _, _, state = heap[0]
+                delay = due - loop.time()
+                if delay > 0:
+                    # Sleep until the next poll is due or a finished poll reschedules its source.
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(heap)
+
+                name = state.spec.name
+                running = self._running.get(name)
+                if self.standby is not None and self.standby():
+                    log.debug("[%s] Poll skipped: standby", name)
+                elif running is not None and not running.done():
+                    log.warning("[%s] Poll skipped: previous poll still running", name)
+                else:
+                    self._running[name] = asyncio.create_task(self._poll(state, due), name=f"poll:{name.lower()}")
+
+                # Provisional next slot; the poll replaces it once its outcome sets the interval.
+                self._schedule(state, max(due + self._jittered(state.cadence.current), loop.time()))
+        finally:
+            for task in self._running.values():
+                task.cancel()
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+            self._running.clear()
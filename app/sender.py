@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from time import monotonic
+from typing import Callable
+
+from . import config
+from . import metrics
+from . import udp
+from .airtime import AirtimeBucket, airtime_cost
+from .receiver import MeshReceiver, PacketKey
+from .routes import Route
+from .util import PRIORITY_BACKGROUND, Message, make_message_id, normalize_message
+
+log = logging.getLogger(__name__)
+
+# Rough encoded size of a nodeinfo payload, used for its airtime cost.
+_NODEINFO_BYTES = 60
+
+
+@dataclass
+class _Job:
+    label: str
+    func: Callable[[], None]
+    priority: int
+    channel: str
+    cost: float
+    enqueued: float = 0.0  # set when the job enters the queue
+    done: asyncio.Future[None] | None = None
+    key: PacketKey | None = None  # (channel hash, packet ID) of text packets, only with a receiver
+    on_done: Callable[[bool], None] | None = None  # told whether the packet went out (or was already on the mesh)
+
+
+class Sender:
+    """
+    Bounded, prioritized outbound queue drained by a single sender task.
+
+    Jobs are sent in (priority, arrival) order, so chunks of one alert keep
+    their order. Each channel has an airtime token bucket; the sender waits
+    for tokens rather than sending back to back, and re-evaluates whenever a
+    higher-priority job arrives. mudp keeps its node identity and packet
+    counter in module globals, so all mudp calls are serialized on one worker
+    thread instead of running inside the event loop. Producers wait when the
+    queue is full (backpressure).
+
+    With a MeshReceiver, a text packet that another gateway has already put
+    on the mesh is skipped when its turn comes, without spending airtime.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = config.SEND_QUEUE_SIZE,
+        airtime_rate: float = config.TX_AIRTIME_RATE,
+        airtime_burst: float = config.TX_AIRTIME_BURST,
+        receiver: MeshReceiver | None = None,
+        executor: Executor | None = None,
+    ) -> None:
+        self.maxsize = max(1, maxsize)
+        self.airtime_rate = airtime_rate
+        self.airtime_burst = airtime_burst
+        self.receiver = receiver
+        self._heap: list[tuple[int, int, _Job]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._unfinished = 0
+        self._draining = False
+        self._buckets: dict[str, AirtimeBucket] = {}
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="udp-send")
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.blocked = 0
+        self.max_depth = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+        self.last_sent: float | None = None  # monotonic time of the last successful send
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self._heap))
+
+    @property
+    def depth(self) -> int:
+        return len(self._heap)
+
+    def _bucket(self, channel: str) -> AirtimeBucket:
+        bucket = self._buckets.get(channel)
+        if bucket is None:
+            bucket = self._buckets[channel] = AirtimeBucket(self.airtime_rate, self.airtime_burst)
+        return bucket
+
+    async def _put(self, job: _Job) -> None:
+        async with self._cond:
+            if len(self._heap) >= self.maxsize:
+                self.blocked += 1
+                log.warning("[TX] Queue full (%d): waiting to enqueue %s", self.maxsize, job.label)
+                await self._cond.wait_for(lambda: len(self._heap) < self.maxsize)
+            job.enqueued = monotonic()
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._unfinished += 1
+            self._idle.clear()
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._heap))
+            self._cond.notify_all()
+
+    async def push(self, msg: Message, on_done: Callable[[bool], None] | None = None) -> None:
+        """
+        Normalize a message, derive its packet ID, and queue it for sending.
+
+        `on_done` is called with True once the packet was sent (or skipped because
+        another gateway already sent it) and with False if sending failed.
+        """
+        normalized = normalize_message(msg.text)
+        packet_id = make_message_id(normalized)
+        await self._put(_Job(
+            label=f"text:{packet_id:08x}",
+            func=partial(udp.send_text, normalized, packet_id=packet_id, route=msg.route),
+            priority=msg.priority,
+            channel=msg.route.channel if msg.route is not None else config.MESHTASTIC_CHANNEL,
+            cost=airtime_cost(len(normalized.encode("utf-8"))),
+            key=(udp.channel_hash(msg.route), packet_id) if self.receiver is not None else None,
+            on_done=on_done,
+        ))
+
+    async def call(
+        self,
+        label: str,
+        func: Callable[[], None],
+        priority: int = PRIORITY_BACKGROUND,
+        route: Route | None = None,
+    ) -> None:
+        """Queue an arbitrary mudp call and wait until it has been executed."""
+        done: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        await self._put(_Job(
+            label=label,
+            func=func,
+            priority=priority,
+            channel=route.channel if route is not None else config.MESHTASTIC_CHANNEL,
+            cost=airtime_cost(_NODEINFO_BYTES),
+            done=done,
+        ))
+        await done
+
+    def prepare(self, func: Callable[[], None]) -> asyncio.Future[None]:
+        """
+        Run a setup call on the mudp worker thread right away, outside the queue.
+
+        The worker runs calls in submission order, so packets queued afterwards
+        are only sent once the setup call has finished.
+        """
+        return asyncio.get_running_loop().run_in_executor(self._executor, func)
+
+    def _next_ready(self) -> tuple[_Job | None, float]:
+        """
+        Return the best job whose channel has airtime now, or the time until one has.
+
+        Only the head job of each channel is considered, so a small low-priority
+        packet cannot overtake a larger high-priority one on the same channel.
+        """
+        wait = float("inf")
+        seen: set[str] = set()
+        for entry in sorted(self._heap):
+            job = entry[2]
+            if job.channel in seen:
+                continue
+            seen.add(job.channel)
+            job_wait = 0.0 if self._draining else self._bucket(job.channel).wait_time(job.cost)
+            if job_wait <= 0:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                return job, 0.0
+            wait = min(wait, job_wait)
+        return None, wait
+
+    async def _take(self) -> _Job:
+        async with self._cond:
+            while True:
+                await self._cond.wait_for(lambda: self._heap)
+                job, wait = self._next_ready()
+                if job is not None and self._carried(job):
+                    continue
+                if job is not None:
+                    self._bucket(job.channel).consume(job.cost)
+                    self._cond.notify_all()
+                    return job
+                # Sleep until airtime is available, or until a new job may change the choice.
+                try:
+                    await asyncio.wait_for(self._cond.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _carried(self, job: _Job) -> bool:
+        """Drop a job whose packet another gateway already sent; returns True if it was dropped."""
+        if self.receiver is None or job.key is None or not self.receiver.carried(job.key):
+            return False
+        self.skipped += 1
+        metrics.PACKETS.inc(outcome="skipped")
+        log.info("[TX] Packet skipped: %s already on the mesh", job.label)
+        if job.on_done is not None:
+            job.on_done(True)
+        self._job_finished()
+        self._cond.notify_all()
+        return True
+
+    def _job_finished(self) -> None:
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._idle.set()
+
+    async def run(self) -> None:
+        log.info(
+            "[TX] Sender started (queue=%d, airtime rate=%.2f burst=%.0fs)",
+            self.maxsize, self.airtime_rate, self.airtime_burst,
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                job = await self._take()
+                waited = monotonic() - job.enqueued
+                self.last_wait = waited
+                self.max_wait = max(self.max_wait, waited)
+                self.total_wait += waited
+                metrics.QUEUE_WAIT_SECONDS.observe(waited, priority=job.priority)
+                started = monotonic()
+                if self.receiver is not None and job.key is not None:
+                    self.receiver.own(job.key)
+                try:
+                    await loop.run_in_executor(self._executor, job.func)
+                except Exception as exc:
+                    self.failed += 1
+                    metrics.PACKETS.inc(outcome="failed")
+                    log.warning("[TX] Send failed: %s (%r)", job.label, exc)
+                    if job.done is not None and not job.done.done():
+                        job.done.set_exception(exc)
+                    if job.on_done is not None:
+                        job.on_done(False)
+                else:
+                    self.sent += 1
+                    self.last_sent = monotonic()
+                    metrics.PACKETS.inc(outcome="sent")
+                    metrics.SEND_SECONDS.observe(monotonic() - started)
+                    log.debug(
+                        "[TX] Packet sent: %s (priority=%d, waited %.3fs, queued %d)",
+                        job.label, job.priority, waited, len(self._heap),
+                    )
+                    if job.done is not None and not job.done.done():
+                        job.done.set_result(None)
+                    if job.on_done is not None:
+                        job.on_done(True)
+                finally:
+                    self._job_finished()
+        except asyncio.CancelledError:
+            log.info("[TX] Sender stopped")
+            raise
+
+    async def flush(self, timeout: float = config.SEND_FLUSH_TIMEOUT) -> bool:
+        """
+        Wait until every queued job has been sent. Returns False on timeout.
+
+        The airtime budget is ignored while draining: on shutdown a late packet
+        is better than a dropped alert.
+        """
+        async with self._cond:
+            self._draining = True
+            self._cond.notify_all()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            log.warning("[TX] Flush timed out: %d messages dropped", len(self._heap))
+            return False
+        finally:
+            handled = self.sent + self.failed
+            log.info(
+                "[TX] Queue stats: enqueued=%d sent=%d failed=%d skipped=%d blocked=%d max_depth=%d avg_wait=%.3fs max_wait=%.3fs",
+                self.enqueued, self.sent, self.failed, self.skipped, self.blocked, self.max_depth,
+                self.total_wait / handled if handled else 0.0, self.max_wait,
+            )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
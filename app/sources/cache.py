@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class RenderCache(Generic[T]):
+    """
+    Rendered output per alert, reused while the alert's content is unchanged.
+
+    Entries are keyed by alert id and validated with a fingerprint of the
+    fields that feed the rendered text. Call `sweep()` after each full parse:
+    entries that were not looked up during that parse belong to alerts that
+    left the payload and are dropped, so the cache never outgrows the feed.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Hashable, tuple[Hashable, T]] = {}
+        self._used: set[Hashable] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, fingerprint: Hashable) -> T | None:
+        self._used.add(key)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, fingerprint: Hashable, value: T) -> T:
+        self._used.add(key)
+        self._entries[key] = (fingerprint, value)
+        return value
+
+    def sweep(self) -> int:
+        """Drop entries not used since the last sweep. Returns how many were dropped."""
+        stale = self._entries.keys() - self._used
+        for key in stale:
+            del self._entries[key]
+        self._used = set()
+        return len(stale)
@@ -2,11 +2,84 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import time
+import zlib
 from collections.abc import Awaitable, Callable
-from typing import Any
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlencode
 
 import aiohttp
 
+from .. import metrics
+from ..cadence import Cadence, freshness, retry_after
+from ..retry import RetryPolicy, breaker_for
+from ..transport import RequestTrace, record as record_trace
+from ..ledger import SentLedger
+from ..util import Message, make_message_id, normalize_message
+from .jsonstream import ArrayItemSplitter
+from .registry import SourceSpec
+
+if TYPE_CHECKING:
+    from ..workers import ParseWorker
+
+_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Returned by fetch_json_with_retries(conditional=True) when the upstream answers 304.
+NOT_MODIFIED: Any = object()
+
+# Queues a message for sending; the callback is told whether it went out (see Sender.push).
+Push = Callable[[Message, Callable[[bool], None] | None], Awaitable[None]]
+
+
+@dataclass
+class _Validators:
+    etag: str | None
+    last_modified: str | None
+
+
+@dataclass
+class ResponseMeta:
+    """Scheduling hints from the last response of a fetch (filled in by fetch_json_with_retries)."""
+    status: int | None = None
+    fresh_for: float | None = None
+    retry_in: float | None = None
+
+
+# Shared by all sources; circuit breakers are per upstream host (see retry.breaker_for).
+_retry_policy = RetryPolicy()
+
+# Per-request validators (ETag, Last-Modified), keyed by URL + query string. The payload itself is not kept:
+# on a 304 the caller reuses the messages it built from it (SourceState.last_msgs).
+_conditional_cache: dict[str, _Validators] = {}
+
+
+def _cache_key(url: str, params: dict[str, Any] | None) -> str:
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+
+async def _read_json_array(
+    resp: aiohttp.ClientResponse, stream_item: Callable[[bytes], Any]
+) -> tuple[list[Any], int]:
+    """
+    Decode a JSON array item by item as the body arrives, keeping what
+    `stream_item` returns. Returns the kept items and the body size in bytes.
+    """
+    splitter = ArrayItemSplitter()
+    out: list[Any] = []
+    size = 0
+    async for chunk in resp.content.iter_chunked(_STREAM_CHUNK_BYTES):
+        size += len(chunk)
+        for raw in splitter.feed(chunk):
+            item = stream_item(raw)
+            if item is not None:
+                out.append(item)
+    splitter.close()
+    return out, size
+
 
 async def fetch_json_with_retries(
     session: aiohttp.ClientSession,
@@ -15,67 +88,331 @@ async def fetch_json_with_retries(
     source_name: str,
     log: logging.Logger,
     params: dict[str, Any] | None = None,
-    max_retries: int,
-    base_backoff: int,
-    timeout_total: int = 15,
+    policy: RetryPolicy | None = None,
+    timeout_total: float | None = None,
+    conditional: bool = False,
+    stream_item: Callable[[bytes], Any] | None = None,
+    raw: bool = False,
+    meta: ResponseMeta | None = None,
 ) -> Any | None:
+    """
+    GET a JSON document, retrying per `policy` behind the upstream's circuit breaker.
+
+    Failed attempts are retried after jittered delays (at least the upstream's
+    Retry-After), as long as the policy's time budget allows; each attempt's
+    timeout is clipped to what is left of it. `policy` defaults to
+    RetryPolicy() from config. While the circuit of the upstream host is open
+    the fetch is skipped without a request; a half-open circuit allows one
+    attempt. Other timeouts come from the session (see
+    transport.create_session) unless `timeout_total` is given.
+
+    With `conditional=True` the ETag / Last-Modified validators of the previous
+    response are sent along, and NOT_MODIFIED is returned when the upstream
+    answers 304 so the caller can reuse what it built from the last payload.
+    With `stream_item` the body must be a JSON array: it is decoded one item at
+    a time as chunks arrive, each item's raw bytes are passed to `stream_item`,
+    and the list of its non-None results is returned.
+    With `raw=True` the body is returned undecoded, as bytes (`stream_item` is then ignored).
+    With `meta`, the status and Cache-Control / Expires / Retry-After hints of
+    the last response received are recorded there.
+    Returns None when all attempts fail or the circuit is open.
+    """
+    policy = policy or RetryPolicy()
+    breaker = breaker_for(url)
+    if not breaker.allow():
+        metrics.FETCH_SKIPPED.inc(source=source_name)
+        if meta is not None:
+            meta.retry_in = breaker.retry_in()
+        log.debug("[%s] Fetch skipped: circuit open (%s)", source_name, breaker.upstream)
+        return None
+
     last_exception: Exception | None = None
+    key = _cache_key(url, params)
+    cached = _conditional_cache.get(key) if conditional else None
+    headers: dict[str, str] = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
 
-    for attempt in range(max_retries):
+    attempts = 1 if breaker.state == breaker.HALF_OPEN else policy.max_attempts
+    deadline = policy.deadline()
+    delay: float | None = None
+    for attempt in range(attempts):
+        started = time.perf_counter()
+        trace = RequestTrace()
+        kwargs: dict[str, Any] = {"trace_request_ctx": trace}
+        timeout = _attempt_timeout(session, timeout_total, deadline)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        hint: float | None = None
         try:
-            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout_total)) as resp:
+            async with session.get(url, params=params, headers=headers, **kwargs) as resp:
+                record_trace(source_name, trace, log)
+                hint = retry_after(resp.headers)
+                if meta is not None:
+                    meta.status = resp.status
+                    meta.fresh_for = freshness(resp.headers)
+                    meta.retry_in = hint
+                if resp.status == 304 and cached is not None:
+                    metrics.FETCH_SECONDS.observe(time.perf_counter() - started, source=source_name, outcome="not_modified")
+                    breaker.success()
+                    log.debug("[%s] Payload unchanged (304)", source_name)
+                    return NOT_MODIFIED
                 resp.raise_for_status()
-                return await resp.json()
+                if raw:
+                    data = await resp.read()
+                    size = len(data)
+                elif stream_item is None:
+                    size = len(await resp.read())
+                    data = await resp.json()
+                else:
+                    data, size = await _read_json_array(resp, stream_item)
+                metrics.FETCH_SECONDS.observe(time.perf_counter() - started, source=source_name, outcome="ok")
+                metrics.PAYLOAD_BYTES.observe(size, source=source_name)
+                breaker.success()
+                if conditional:
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+                    if etag or last_modified:
+                        _conditional_cache[key] = _Validators(etag, last_modified)
+                    else:
+                        _conditional_cache.pop(key, None)
+                return data
         except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
             last_exception = exc
-            if attempt < max_retries - 1:
-                backoff = base_backoff * (2 ** attempt)
-                log.warning(
-                    "[%s] Request failed (attempt %d/%d): %s; retrying in %ss",
-                    source_name,
-                    attempt + 1,
-                    max_retries,
-                    exc,
-                    backoff,
+            metrics.FETCH_SECONDS.observe(time.perf_counter() - started, source=source_name, outcome="error")
+            if not policy.retryable(exc):
+                log.error("[%s] Request failed (not retryable): %s", source_name, exc)
+                break
+            if attempt == attempts - 1:
+                log.error("[%s] Request failed after %d attempts: %s", source_name, attempts, exc)
+                break
+            delay = policy.next_delay(delay)
+            if hint is not None:
+                delay = max(delay, hint)  # the upstream asked for at least this much
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                log.error(
+                    "[%s] Request failed (attempt %d/%d): %s; retry budget of %ss exhausted",
+                    source_name, attempt + 1, attempts, exc, policy.budget,
                 )
-                await asyncio.sleep(backoff)
-            else:
-                log.error("[%s] Request failed after %d attempts: %s", source_name, max_retries, exc)
+                break
+            metrics.FETCH_RETRIES.inc(source=source_name)
+            log.warning(
+                "[%s] Request failed (attempt %d/%d): %s; retrying in %.1fs",
+                source_name,
+                attempt + 1,
+                attempts,
+                exc,
+                delay,
+            )
+            await asyncio.sleep(delay)
 
-    log.error("[%s] All retry attempts exhausted. Last error: %s", source_name, last_exception)
+    breaker.failure()
+    metrics.FETCH_FAILURES.inc(source=source_name)
+    log.error(
+        "[%s] All retry attempts exhausted. Last error: %s (circuit %s)", source_name, last_exception, breaker.state
+    )
     return None
 
 
-async def run_source(
+def _attempt_timeout(
+    session: aiohttp.ClientSession, total: float | None, deadline: float | None
+) -> aiohttp.ClientTimeout | None:
+    """Timeout of one attempt: the session's, with `total` overridden and clipped to the fetch deadline."""
+    if deadline is not None:
+        remaining = max(0.001, deadline - time.monotonic())
+        limit = total if total is not None else session.timeout.total
+        if limit is None or remaining < limit:
+            total = remaining
+    if total is None:
+        return None
+    return aiohttp.ClientTimeout(total=total, connect=session.timeout.connect, sock_read=session.timeout.sock_read)
+
+
+def messages_fingerprint(msgs: list[Message]) -> int:
+    """CRC32 over the texts and routes of a poll's messages; equal payloads give equal fingerprints."""
+    crc = 0
+    for m in msgs:
+        crc = zlib.crc32(f"{m.route.name if m.route is not None else ''}\x1f{m.text}\x1e".encode("utf-8"), crc)
+    return crc
+
+
+def ledger_key(m: Message) -> str:
+    """Ledger key of a message: its packet ID, scoped to the route it is sent on."""
+    packet_id = make_message_id(normalize_message(m.text))
+    return f"{m.route.name}/{packet_id}" if m.route is not None else str(packet_id)
+
+
+async def _push_new(
     source_name: str,
     log: logging.Logger,
-    fetch_messages: Callable[[], Awaitable[list[str]]],
-    push: Callable[[str], None],
-    interval: int,
+    msgs: list[Message],
+    push: Push,
+    ledger: SentLedger | None,
+) -> None:
+    """Push messages that are neither in the ledger nor still queued; each is recorded once it was sent."""
+    if ledger is None:
+        for m in msgs:
+            await push(m, None)
+        metrics.MESSAGES.inc(len(msgs), source=source_name, outcome="pushed")
+        return
+
+    suppressed = 0
+    for m in msgs:
+        key = ledger_key(m)
+        if key in ledger:
+            ledger.touch(key)
+            suppressed += 1
+            continue
+        if key in ledger.pending:
+            suppressed += 1
+            continue
+        ledger.pending.add(key)
+        await push(m, partial(ledger.settle, key))
+    metrics.MESSAGES.inc(len(msgs) - suppressed, source=source_name, outcome="pushed")
+    metrics.MESSAGES.inc(suppressed, source=source_name, outcome="suppressed")
+
+    if suppressed:
+        log.debug("[%s] Messages suppressed (already sent): %d", source_name, suppressed)
+
+
+def _seed(source_name: str, msgs: list[Message], ledger: SentLedger | None) -> None:
+    """Record messages as sent without pushing them."""
+    if ledger is not None:
+        for m in msgs:
+            ledger.touch(ledger_key(m))
+    metrics.MESSAGES.inc(len(msgs), source=source_name, outcome="suppressed")
+
+
+class SourceState:
+    """Runtime state the scheduler keeps for one source between polls."""
+
+    def __init__(self, spec: SourceSpec) -> None:
+        self.spec = spec
+        self.last_msgs: list[Message] = []
+        self.fingerprint: int | None = None
+        self.warmed_up = False
+        self.resume = False  # first poll continues from persisted state instead of warming up
+        self.cadence = Cadence(spec.interval, spec.min_interval, spec.max_interval)
+        self.meta = ResponseMeta()
+        self.changed = False  # the last poll's payload differed from the one before
+        self.active = False  # the last poll produced messages
+        self.polls = 0
+        self.failures = 0
+        self.last_success: float | None = None  # monotonic time of the last poll that got a payload (or a 304)
+        self.worker: ParseWorker | None = None  # decodes and parses in a worker process (PARSE_WORKERS)
+
+
+async def fetch_messages(
+    session: aiohttp.ClientSession, state: SourceState, log: logging.Logger
+) -> list[Message] | None:
+    """
+    Fetch a source's payload and parse it, reusing the last messages when it is
+    unchanged. Returns None when the fetch failed, leaving the state untouched.
+    If parsing raises, the payload's validators are forgotten so the next poll
+    fetches and parses it in full.
+    """
+    spec = state.spec
+    worker = state.worker
+    data = await fetch_json_with_retries(
+        session,
+        spec.url,
+        source_name=spec.name,
+        log=log,
+        params=spec.params,
+        policy=_retry_policy,
+        conditional=True,
+        stream_item=spec.stream_item,
+        raw=worker is not None,
+        meta=state.meta,
+    )
+    if data is NOT_MODIFIED:
+        return list(state.last_msgs)
+    if data is None:
+        return None
+
+    try:
+        if worker is not None:
+            msgs, elapsed = await worker.parse(data)
+        else:
+            started = time.perf_counter()
+            msgs = spec.parse(data)
+            elapsed = time.perf_counter() - started
+    except Exception:
+        # The response's validators are already cached: drop them, or the next poll gets a 304
+        # and the payload that failed (with its alerts) is never parsed again.
+        _conditional_cache.pop(_cache_key(spec.url, spec.params), None)
+        raise
+    metrics.PARSE_SECONDS.observe(elapsed, source=spec.name)
+    state.last_msgs = msgs
+    return msgs
+
+
+async def poll_source(
+    session: aiohttp.ClientSession,
+    state: SourceState,
+    push: Push,
+    ledger: SentLedger | None,
     warmup: bool,
+    log: logging.Logger,
 ) -> None:
     """
-    Generic source runner that handles the fetch > process > push loop.
+    Run one fetch > process > push cycle for a source.
 
     Args:
-        source_name: Display name for logging (e.g., "VMA", "SMHI")
+        session: Shared HTTP session
+        state: Source state; carries the spec and what was built from the last payload
+        push: Async callback that queues each message for sending and reports whether it was sent
+        ledger: Optional sent-message ledger; messages already in it are not pushed again
+        warmup: If True, the first poll of the source only seeds the ledger (unless it resumes
+            from persisted state, see SourceState.resume)
         log: Logger instance
-        fetch_messages: Async function that returns list[str] of messages
-        push: Callback to send each message
-        interval: Sleep interval between fetches (seconds)
-        warmup: If True, suppress initial messages on startup
     """
-    log.info("[%s] Source started (warmup=%s)", source_name, warmup)
-    msgs = await fetch_messages()
+    name = state.spec.name
+    state.meta = ResponseMeta()
+    state.changed = False
+    msgs = await fetch_messages(session, state, log)
+    state.polls += 1
+    if msgs is None:
+        # Keep warmup/resume pending until a payload actually arrives.
+        state.failures += 1
+        return
+    state.last_success = time.monotonic()
+    fingerprint = messages_fingerprint(msgs)
+    state.changed = state.fingerprint is not None and fingerprint != state.fingerprint
+    state.active = bool(msgs)
 
-    if warmup:
-        log.info("[%s] Warmup complete: initial messages suppressed (%d)", source_name, len(msgs))
-    else:
-        for m in msgs:
-            push(m)
+    if state.resume:
+        state.resume = False
+        state.warmed_up = True
+        unchanged = fingerprint == state.fingerprint
+        if ledger is not None:
+            # The ledger knows which messages went out: alerts that changed while the daemon was down,
+            # or that were still queued when it stopped, are sent now; nothing else is repeated.
+            if unchanged:
+                log.info("[%s] Resume: payload unchanged, pushing only messages not sent before", name)
+            else:
+                log.info("[%s] Resume: payload changed since last run, pushing missed messages", name)
+            await _push_new(name, log, msgs, push, ledger)
+            state.fingerprint = fingerprint
+            return
+        _seed(name, msgs, ledger)
+        state.fingerprint = fingerprint
+        log.info(
+            "[%s] Resume complete: payload %s, messages suppressed (%d)",
+            name, "unchanged" if unchanged else "changed (no ledger)", len(msgs),
+        )
+        return
 
-    while True:
-        await asyncio.sleep(interval)
-        msgs = await fetch_messages()
-        for m in msgs:
-            push(m)
+    if warmup and not state.warmed_up:
+        state.warmed_up = True
+        _seed(name, msgs, ledger)
+        state.fingerprint = fingerprint
+        log.info("[%s] Warmup complete: initial messages suppressed (%d)", name, len(msgs))
+        return
+
+    state.warmed_up = True
+    await _push_new(name, log, msgs, push, ledger)
+    state.fingerprint = fingerprint
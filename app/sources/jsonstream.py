@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import re
+
+# A complete string, a leaf array such as a coordinate pair (no strings or
+# containers inside, so it does not change depth), an unterminated string
+# (wait for more data), or a bracket. Skipping leaf arrays in one match keeps
+# geometry-heavy payloads from costing one Python iteration per bracket.
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|\[[^\[\]{}"]*\]|"|[\[\]{}]')
+_WS = b" \t\r\n"
+
+
+class ArrayItemSplitter:
+    """
+    Incrementally split a top-level JSON array into the raw bytes of its items.
+
+    Feed the response body chunk by chunk. Only the item currently being
+    received is buffered, so peak memory is bounded by the largest item rather
+    than the whole document. Only object items and arrays that contain strings
+    or containers are returned; scalar and all-scalar array items are skipped.
+    The bytes are not validated here; decoding each item with json.loads does.
+    """
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._item_start: int | None = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        buf = self._buf
+        buf += chunk
+        items: list[bytes] = []
+        pos = self._pos
+        for m in _TOKEN.finditer(buf, pos):
+            tok = m.group()
+            if tok == b'"':
+                pos = m.start()
+                break
+            pos = m.end()
+            if len(tok) > 1:  # complete string or leaf array
+                if self._depth == 0 and tok[0] == 0x5B:  # the whole document is a leaf array, e.g. []
+                    self.done = True
+                continue
+            if tok in (b"[", b"{"):
+                if self._depth == 0 and tok != b"[":
+                    raise ValueError("JSON document is not an array")
+                if self._depth == 1:
+                    self._item_start = m.start()
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 1 and self._item_start is not None:
+                    items.append(bytes(buf[self._item_start:m.end()]))
+                    self._item_start = None
+                elif self._depth == 0:
+                    self.done = True
+        else:
+            pos = len(buf)
+
+        keep_from = self._item_start if self._item_start is not None else pos
+        del buf[:keep_from]
+        if self._item_start is not None:
+            self._item_start -= keep_from
+        self._pos = pos - keep_from
+        return items
+
+    def close(self) -> None:
+        if not self.done:
+            raise ValueError("JSON array is truncated")
+
+
+def array_item_spans(data: bytes, start: int) -> tuple[list[tuple[int, int]], int]:
+    """
+    Return the (start, end) spans of the container items of the array that
+    opens at `data[start]`, and the index just past its closing bracket.
+    """
+    spans: list[tuple[int, int]] = []
+    depth = 0
+    item_start = 0
+    for m in _TOKEN.finditer(data, start):
+        tok = m.group()
+        if tok == b'"':
+            break
+        if len(tok) > 1:
+            if depth == 0:  # the array itself has no container items
+                return spans, m.end()
+            continue
+        if tok in (b"[", b"{"):
+            if depth == 1:
+                item_start = m.start()
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                spans.append((item_start, m.end()))
+            elif depth == 0:
+                return spans, m.end()
+    raise ValueError("JSON array is truncated")
+
+
+def find_member_array(data: bytes, key: bytes) -> int | None:
+    """
+    Find the array value of member `key` of the object in `data` (a single
+    JSON object) and return the index of its opening bracket.
+    """
+    needle = b'"' + key + b'"'
+    depth = 0
+    for m in _TOKEN.finditer(data):
+        tok = m.group()
+        if len(tok) > 1 or tok == b'"':
+            if depth == 1 and tok == needle:
+                idx = m.end()
+                while idx < len(data) and data[idx] in _WS:
+                    idx += 1
+                if idx < len(data) and data[idx] == 0x3A:  # ':'
+                    idx += 1
+                    while idx < len(data) and data[idx] in _WS:
+                        idx += 1
+                    if idx < len(data) and data[idx] == 0x5B:  # '['
+                        return idx
+            continue
+        depth += 1 if tok in (b"[", b"{") else -1
+    return None
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import importlib
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from ..util import PRIORITY_NORMAL, Message
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "meshdaemon.sources"
+BUILTIN_SOURCES = ("vma", "smhi")
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    """
+    Declarative description of a polled source.
+
+    `parse` turns the decoded JSON payload into outbound messages and must not
+    do I/O. If `stream_item` is set, the payload must be a JSON array that is
+    decoded incrementally: `stream_item` gets the raw bytes of each item and
+    returns the decoded (and possibly trimmed) item, or None to drop it, and
+    `parse` receives the list of kept items. `priority` orders polls that fall
+    due at the same time (lower first). With adaptive polling the interval
+    moves between `min_interval` and `max_interval` (both default to
+    `interval`). A disabled source is registered but never scheduled.
+    """
+    name: str
+    url: str
+    interval: int
+    parse: Callable[[Any], list[Message]]
+    params: dict[str, Any] | None = None
+    stream_item: Callable[[bytes], Any] | None = None
+    priority: int = PRIORITY_NORMAL
+    enabled: bool = True
+    min_interval: int | None = None
+    max_interval: int | None = None
+
+
+_registry: dict[str, SourceSpec] = {}
+
+
+def register(spec: SourceSpec) -> SourceSpec:
+    key = spec.name.lower()
+    if key in _registry and _registry[key] is not spec:
+        log.warning("[SOURCES] Source replaced: %s", spec.name)
+    _registry[key] = spec
+    return spec
+
+
+def _coerce(obj: Any, origin: str) -> SourceSpec:
+    if callable(obj) and not isinstance(obj, SourceSpec):
+        obj = obj()
+    if not isinstance(obj, SourceSpec):
+        raise TypeError(f"{origin} did not provide a SourceSpec")
+    return obj
+
+
+def _load_ref(ref: str) -> SourceSpec:
+    """Resolve a builtin name ("vma") or an import reference ("pkg.module:ATTR")."""
+    if ":" in ref:
+        module_name, attr = ref.split(":", 1)
+        return _coerce(getattr(importlib.import_module(module_name), attr), ref)
+    module = importlib.import_module(f"{__package__}.{ref}")
+    return _coerce(module.SOURCE, ref)
+
+
+def load_sources(refs: list[str], use_entry_points: bool = True) -> list[SourceSpec]:
+    """Register the configured sources plus any installed plugins and return the enabled ones."""
+    for ref in refs:
+        register(_load_ref(ref))
+
+    if use_entry_points:
+        from importlib.metadata import entry_points  # scans installed distributions; only when plugins are enabled
+
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            try:
+                register(_coerce(ep.load(), f"entry point {ep.name}"))
+            except Exception as exc:
+                log.error("[SOURCES] Plugin load failed: %s (%r)", ep.name, exc)
+
+    specs = [spec for spec in _registry.values() if spec.enabled]
+    log.info("[SOURCES] Sources loaded: %s", ", ".join(spec.name for spec in specs) or "none")
+    return specs
@@ -1,26 +1,49 @@
 from __future__ import annotations
 
+import json
 import logging
 import re
 from zoneinfo import ZoneInfo
-from datetime import datetime
-from typing import Callable
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any
 
-import aiohttp
-
-from ..util import truncate_utf8
+from ..util import PRIORITY_HIGH, PRIORITY_NORMAL, Message, truncate_utf8
 from .. import config
-from .common import fetch_json_with_retries, run_source
+from ..compact import compact_message
+from .. import metrics
+from ..routes import ROUTES, Route
+from .cache import RenderCache
+from .jsonstream import array_item_spans, find_member_array
+from .registry import SourceSpec
 
 log = logging.getLogger(__name__)
 
 INTERVAL = config.SMHI_INTERVAL
 URL = config.SMHI_URL
-GEOCODE = config.SMHI_GEOCODE
-MAX_RETRIES = config.MAX_RETRIES
-BASE_BACKOFF = config.BASE_BACKOFF
+STREAM = config.SMHI_STREAM
+ROUTES_SMHI: list[Route] = [r for r in ROUTES if r.smhi_geocode is not None]
+
+
+@lru_cache(maxsize=None)
+def _stockholm() -> ZoneInfo:
+    # Loaded on first use: reading tzdata is not needed until the first warning is rendered.
+    return ZoneInfo("Europe/Stockholm")
+
+
+# Rendered messages per warning area, reused across polls while the area is unchanged.
+_render_cache: RenderCache[list[Message]] = RenderCache()
+
+
+def _index_routes(routes: list[Route]) -> dict[int, list[Route]]:
+    index: dict[int, list[Route]] = {}
+    for route in routes:
+        index.setdefault(route.smhi_geocode, []).append(route)
+    return index
+
 
-_STOCKHOLM = ZoneInfo("Europe/Stockholm")
+# Area id -> routes that want it, so each warning area is matched once per payload, not once per route.
+_ROUTES_BY_AREA = _index_routes(ROUTES_SMHI)
 
 _REPLACEMENTS = {
     "norra": "N",
@@ -64,24 +87,109 @@ def format_range(start_local: datetime, end_local: datetime) -> str:
 def _to_stockholm(dt: datetime) -> datetime:
     """Convert a datetime to Stockholm timezone."""
     if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=ZoneInfo("UTC"))
-    return dt.astimezone(_STOCKHOLM)
-
-
-async def fetch_messages(session: aiohttp.ClientSession) -> list[str]:
-    data = await fetch_json_with_retries(
-        session,
-        URL,
-        source_name="SMHI",
-        log=log,
-        max_retries=MAX_RETRIES,
-        base_backoff=BASE_BACKOFF,
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(_stockholm())
+
+
+# SMHI repeats a handful of start/end timestamps across hundreds of warning areas.
+# The rendered range depends only on the two strings (DST is resolved per
+# timestamp by the conversion), so entries never go stale and need no invalidation.
+@lru_cache(maxsize=1024)
+def time_range(start_iso: str, end_iso: str) -> str:
+    """Render an ISO 8601 time range in Stockholm time. Raises ValueError if either end is invalid."""
+    return format_range(
+        _to_stockholm(datetime.fromisoformat(start_iso)),
+        _to_stockholm(datetime.fromisoformat(end_iso)),
+    )
+
+
+def _routes_for(affected_areas: Any) -> list[Route]:
+    """Routes whose area id appears in a warning area's affectedAreas list."""
+    routes: list[Route] = []
+    if not isinstance(affected_areas, list):
+        return routes
+    for area in affected_areas:
+        area_id = area.get("id") if isinstance(area, dict) else None
+        if isinstance(area_id, int):
+            for route in _ROUTES_BY_AREA.get(area_id, ()):
+                if route not in routes:
+                    routes.append(route)
+    return routes
+
+
+def prefilter(raw: bytes) -> dict[str, Any] | None:
+    """
+    Decode one streamed alert, keeping only warning areas that affect a route.
+
+    Only each area's affectedAreas list is decoded up front; areas (and their
+    geometry) that no route wants are never turned into Python objects.
+    """
+    start = find_member_array(raw, b"warningAreas")
+    if start is None:
+        return None
+    spans, end = array_item_spans(raw, start)
+
+    kept: list[Any] = []
+    for span_start, span_end in spans:
+        area_raw = raw[span_start:span_end]
+        affected_start = find_member_array(area_raw, b"affectedAreas")
+        if affected_start is None:
+            continue
+        _, affected_end = array_item_spans(area_raw, affected_start)
+        if _routes_for(json.loads(area_raw[affected_start:affected_end])):
+            kept.append(json.loads(area_raw))
+    if not kept:
+        return None
+
+    alert = json.loads(raw[:start] + b"[]" + raw[end:])
+    if isinstance(alert, dict):
+        alert["warningAreas"] = kept
+    return alert
+
+
+def _render_area(
+    alert_id: object,
+    wa: dict[str, Any],
+    warning_level: dict[str, Any],
+    routes: list[Route],
+) -> list[Message]:
+    """Render one warning area into chunks for each of its routes ([] if it must be skipped)."""
+    start_iso = wa.get("approximateStart")
+    end_iso = wa.get("approximateEnd")
+    if not isinstance(start_iso, str) or not isinstance(end_iso, str):
+        log.warning("[SMHI] Alert skipped (missing time range): %s", alert_id)
+        return []
+
+    try:
+        time_part = time_range(start_iso, end_iso)
+    except ValueError:
+        log.warning("[SMHI] Alert skipped (invalid time range): %s", alert_id)
+        return []
+
+    area_name = wa.get("areaName")
+    area_name_sv = area_name.get("sv") if isinstance(area_name, dict) else "okänt område"
+    event_desc = wa.get("eventDescription")
+    event_desc_sv = event_desc.get("sv") if isinstance(event_desc, dict) else "saknar beskrivning"
+    level_sv = warning_level.get("sv") or "Okänd"
+
+    full_message = apply_replacements(
+        f"SMHI: {level_sv} varning {area_name_sv} - {event_desc_sv} [{time_part}]"
     )
+
+    priority = PRIORITY_HIGH if warning_level.get("code") in ("ORANGE", "RED") else PRIORITY_NORMAL
+
+    log.info("[SMHI] Alert accepted: %s (%s)", alert_id, full_message)
+    chunks = truncate_utf8(compact_message(full_message))
+    metrics.ALERT_CHUNKS.observe(len(chunks), source="SMHI")
+    return [Message(chunk, priority, route) for route in routes for chunk in chunks]
+
+
+def parse(data: Any) -> list[Message]:
     if not isinstance(data, list):
         log.error("[SMHI] Payload type invalid: %s", type(data).__name__)
         return []
 
-    out: list[str] = []
+    out: list[Message] = []
     for alert in data:
         if not isinstance(alert, dict):
             continue
@@ -90,7 +198,7 @@ async def fetch_messages(session: aiohttp.ClientSession) -> list[str]:
         if not isinstance(warning_areas, list):
             continue
 
-        for wa in warning_areas:
+        for wa_idx, wa in enumerate(warning_areas):
             if not isinstance(wa, dict):
                 continue
             warning_level = wa.get("warningLevel")
@@ -99,53 +207,43 @@ async def fetch_messages(session: aiohttp.ClientSession) -> list[str]:
             if warning_level.get("code") == "MESSAGE":
                 continue
 
-            affected_areas = wa.get("affectedAreas")
-            if not isinstance(affected_areas, list):
-                continue
-            if not any(isinstance(area, dict) and area.get("id") == GEOCODE for area in affected_areas):
+            routes = _routes_for(wa.get("affectedAreas"))
+            if not routes:
                 continue
 
-            start_iso = wa.get("approximateStart")
-            end_iso = wa.get("approximateEnd")
-            if not isinstance(start_iso, str) or not isinstance(end_iso, str):
-                log.warning("[SMHI] Alert skipped (missing time range): %s", alert_id)
-                continue
-
-            try:
-                start_local = _to_stockholm(datetime.fromisoformat(start_iso))
-                end_local = _to_stockholm(datetime.fromisoformat(end_iso))
-            except ValueError:
-                log.warning("[SMHI] Alert skipped (invalid time range): %s", alert_id)
-                continue
-            time_part = format_range(start_local, end_local)
-
-            area_name = wa.get("areaName")
-            area_name_sv = area_name.get("sv") if isinstance(area_name, dict) else "okänt område"
-            event_desc = wa.get("eventDescription")
-            event_desc_sv = event_desc.get("sv") if isinstance(event_desc, dict) else "saknar beskrivning"
-            level_sv = warning_level.get("sv") or "Okänd"
-
-            full_message = apply_replacements(
-                f"SMHI: {level_sv} varning {area_name_sv} - {event_desc_sv} [{time_part}]"
+            # Only re-render when a field that feeds the message (or the set of routes) changed.
+            key = (str(alert_id), str(wa.get("id", wa_idx)))
+            fingerprint = (
+                str(warning_level.get("code")),
+                str(warning_level.get("sv")),
+                str(wa.get("approximateStart")),
+                str(wa.get("approximateEnd")),
+                str(wa.get("areaName")),
+                str(wa.get("eventDescription")),
+                tuple(r.name for r in routes),
             )
+            rendered = _render_cache.get(key, fingerprint)
+            if rendered is None:
+                rendered = _render_cache.put(key, fingerprint, _render_area(alert_id, wa, warning_level, routes))
+            out.extend(rendered)
 
-            log.info("[SMHI] Alert accepted: %s (%s)", alert_id, full_message)
-            out.extend(truncate_utf8(full_message))
-
-    msgs = [m.strip() for m in out if m.strip()]
+    _render_cache.sweep()
+    msgs = [m for m in out if m.text]
     log.debug("[SMHI] Messages fetched: %d", len(msgs))
     for m in msgs:
-        log.debug("[SMHI] Message ready: %s", m)
+        log.debug("[SMHI] Message ready: %s", m.text)
 
     return msgs
 
 
-async def run(session: aiohttp.ClientSession, warmup: bool, push: Callable[[str], None]) -> None:
-    await run_source(
-        source_name="SMHI",
-        log=log,
-        fetch_messages=lambda: fetch_messages(session),
-        push=push,
-        interval=INTERVAL,
-        warmup=warmup,
-    )
+SOURCE = SourceSpec(
+    name="SMHI",
+    url=URL,
+    interval=INTERVAL,
+    min_interval=config.SMHI_MIN_INTERVAL,
+    max_interval=config.SMHI_MAX_INTERVAL,
+    parse=parse,
+    stream_item=prefilter if STREAM else None,
+    priority=PRIORITY_HIGH,
+    enabled=bool(ROUTES_SMHI),
+)
@@ -2,21 +2,26 @@ from __future__ import annotations
 
 import logging
 from datetime import datetime
-from typing import Callable
+from typing import Any
 
-import aiohttp
-
-from ..util import truncate_utf8
+from ..util import PRIORITY_CRITICAL, PRIORITY_LOW, Message, truncate_utf8
 from .. import config
-from .common import fetch_json_with_retries, run_source
+from ..compact import compact_message
+from .. import metrics
+from ..routes import ROUTES, Route
+from .cache import RenderCache
+from .registry import SourceSpec
 
 log = logging.getLogger(__name__)
 
 INTERVAL = config.VMA_INTERVAL
 URL = config.VMA_URL
-GEOCODE = config.VMA_GEOCODE
-MAX_RETRIES = config.MAX_RETRIES
-BASE_BACKOFF = config.BASE_BACKOFF
+ROUTES_VMA: list[Route] = [r for r in ROUTES if r.vma_geocode]
+# With a single geocode the API filters for us; otherwise fetch all alerts once and filter per route.
+GEOCODE: str | None = ROUTES_VMA[0].vma_geocode if len({r.vma_geocode for r in ROUTES_VMA}) == 1 else None
+
+# Rendered messages per alert, reused across polls while the alert is unchanged.
+_render_cache: RenderCache[list[Message]] = RenderCache()
 
 
 def _sv_message(alert: dict[str, object]) -> str | None:
@@ -59,42 +64,89 @@ def _sv_message(alert: dict[str, object]) -> str | None:
         return None
 
 
-async def fetch_messages(session: aiohttp.ClientSession) -> list[str]:
-    params = {"geocode": GEOCODE}
-    data = await fetch_json_with_retries(
-        session,
-        URL,
-        source_name="VMA",
-        log=log,
-        params=params,
-        max_retries=MAX_RETRIES,
-        base_backoff=BASE_BACKOFF,
-    )
+def _alert_geocodes(alert: dict[str, object]) -> set[str]:
+    """Collect info[].area[].geocode[].value codes from an alert."""
+    codes: set[str] = set()
+    info = alert.get("info") or alert.get("Info") or []
+    for i in info if isinstance(info, list) else []:
+        if not isinstance(i, dict):
+            continue
+        areas = i.get("area") or i.get("Area") or []
+        for area in areas if isinstance(areas, list) else []:
+            if not isinstance(area, dict):
+                continue
+            geocodes = area.get("geocode") or area.get("Geocode") or []
+            for gc in geocodes if isinstance(geocodes, list) else []:
+                if isinstance(gc, dict):
+                    value = gc.get("value") or gc.get("Value")
+                    if value:
+                        codes.add(str(value))
+    return codes
+
+
+def _matching_routes(alert: dict[str, object]) -> list[Route]:
+    if GEOCODE is not None:
+        return ROUTES_VMA
+    codes = _alert_geocodes(alert)
+    # A county code (e.g. "01") also matches its municipalities (e.g. "0180").
+    return [r for r in ROUTES_VMA if any(c.startswith(r.vma_geocode) for c in codes)]
+
+
+def _render_alert(alert: dict[str, object], routes: list[Route]) -> list[Message]:
+    """Render one alert into chunks for each of its routes ([] if it is not broadcast)."""
+    msg = _sv_message(alert)
+    if not msg:
+        return []
+    priority = PRIORITY_CRITICAL if alert.get("status") == "Actual" else PRIORITY_LOW
+    chunks = truncate_utf8(compact_message(msg))
+    metrics.ALERT_CHUNKS.observe(len(chunks), source="VMA")
+    return [Message(chunk, priority, route) for route in routes for chunk in chunks]
+
+
+def parse(data: Any) -> list[Message]:
     if not isinstance(data, dict):
         log.error("[VMA] Payload type invalid: %s", type(data).__name__)
         return []
 
-    out: list[str] = []
-    for alert in data.get("alerts") or []:
+    out: list[Message] = []
+    for idx, alert in enumerate(data.get("alerts") or []):
         if not isinstance(alert, dict):
             continue
-        msg = _sv_message(alert)
-        if msg:
-            out.extend(truncate_utf8(msg))
+        routes = _matching_routes(alert)
+        if not routes:
+            continue
 
-    msgs = [m.strip() for m in out if m.strip()]
+        # Only re-render when a field that feeds the message (or the set of routes) changed.
+        key = str(alert.get("identifier") or alert.get("id") or idx)
+        fingerprint = (
+            str(alert.get("status")),
+            str(alert.get("msgType")),
+            str(alert.get("sent")),
+            str(alert.get("info") or alert.get("Info")),
+            tuple(r.name for r in routes),
+        )
+        rendered = _render_cache.get(key, fingerprint)
+        if rendered is None:
+            rendered = _render_cache.put(key, fingerprint, _render_alert(alert, routes))
+        out.extend(rendered)
+
+    _render_cache.sweep()
+
+    msgs = [m for m in out if m.text]
     log.debug("[VMA] Messages fetched: %d", len(msgs))
     for m in msgs:
-        log.debug("[VMA] Message ready: %s", m)
+        log.debug("[VMA] Message ready: %s", m.text)
     return msgs
 
 
-async def run(session: aiohttp.ClientSession, warmup: bool, push: Callable[[str], None]) -> None:
-    await run_source(
-        source_name="VMA",
-        log=log,
-        fetch_messages=lambda: fetch_messages(session),
-        push=push,
-        interval=INTERVAL,
-        warmup=warmup,
-    )
+SOURCE = SourceSpec(
+    name="VMA",
+    url=URL,
+    interval=INTERVAL,
+    min_interval=config.VMA_MIN_INTERVAL,
+    max_interval=config.VMA_MAX_INTERVAL,
+    parse=parse,
+    params={"geocode": GEOCODE} if GEOCODE is not None else None,
+    priority=PRIORITY_CRITICAL,
+    enabled=bool(ROUTES_VMA),
+)
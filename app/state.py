@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from time import time
+
+from . import config
+from .ledger import SentLedger
+
+STATE_VERSION = 1
+
+# Changes that do not add ledger keys or change a payload (refreshes, schedule
+# moves) are flushed to disk at most this often.
+_SAVE_INTERVAL = 300
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class SourceRecord:
+    """What is persisted per source between runs."""
+    fingerprint: int | None = None  # of the messages built from the last processed payload
+    next_poll: float | None = None  # wall clock
+
+
+class StateStore:
+    """
+    On-disk daemon state: the sent ledger, each source's last payload
+    fingerprint and its next poll time, in one JSON file.
+
+    The file is replaced atomically (temp file, fsync, rename), so a crash
+    mid-write leaves the previous state intact. A missing, unreadable or
+    expired file means a fresh start; it never stops the daemon. State older
+    than `max_age` (the ledger TTL) is ignored, because its ledger could no
+    longer tell which alerts were already sent.
+    """
+
+    def __init__(self, path: str, ledger: SentLedger | None, max_age: int = config.LEDGER_TTL) -> None:
+        self.path = path
+        self.ledger = ledger
+        self.max_age = max_age
+        self.sources: dict[str, SourceRecord] = {}
+        self.loaded = False
+        self._dirty = False
+        self._last_save = 0.0
+
+    def load(self) -> bool:
+        """Load state from `path`. Returns True if usable state was found."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as exc:
+            log.warning("[STATE] Load failed, starting fresh: %s (%r)", self.path, exc)
+            return False
+        if not isinstance(raw, dict):
+            log.warning("[STATE] Load failed, starting fresh: %s (invalid format)", self.path)
+            return False
+
+        saved = raw.get("saved")
+        age = time() - saved if isinstance(saved, (int, float)) else None
+        if raw.get("version") != STATE_VERSION or age is None:
+            log.warning("[STATE] Load failed, starting fresh: %s (unsupported version)", self.path)
+            return False
+        if age > self.max_age:
+            log.info("[STATE] State expired, starting fresh: %s (saved %ds ago)", self.path, age)
+            return False
+
+        ledger_raw = raw.get("ledger")
+        if self.ledger is not None and isinstance(ledger_raw, dict):
+            self.ledger.restore(ledger_raw)
+        sources = raw.get("sources")
+        for name, rec in (sources.items() if isinstance(sources, dict) else ()):
+            if not isinstance(rec, dict):
+                continue
+            fingerprint, next_poll = rec.get("fingerprint"), rec.get("next_poll")
+            self.sources[str(name)] = SourceRecord(
+                fingerprint if isinstance(fingerprint, int) else None,
+                float(next_poll) if isinstance(next_poll, (int, float)) else None,
+            )
+
+        self.loaded = True
+        log.info(
+            "[STATE] State loaded: %d ledger entries, %d sources (saved %ds ago, %s)",
+            len(self.ledger) if self.ledger is not None else 0, len(self.sources), age, self.path,
+        )
+        return True
+
+    def record(self, name: str, fingerprint: int | None = None, next_poll: float | None = None) -> None:
+        """Update a source's record; a changed fingerprint is written on the next save."""
+        rec = self.sources.setdefault(name, SourceRecord())
+        if fingerprint is not None and fingerprint != rec.fingerprint:
+            rec.fingerprint = fingerprint
+            self._dirty = True
+        if next_poll is not None:
+            rec.next_poll = next_poll
+
+    def save(self, force: bool = False) -> None:
+        """Atomically write the state if something important changed, the save interval passed, or `force`."""
+        ledger_dirty = self.ledger is not None and self.ledger.dirty
+        if not (force or self._dirty or ledger_dirty or time() - self._last_save >= _SAVE_INTERVAL):
+            return
+        data = {
+            "version": STATE_VERSION,
+            "saved": round(time(), 1),
+            "ledger": self.ledger.snapshot() if self.ledger is not None else {},
+            "sources": {
+                name: {"fingerprint": rec.fingerprint, "next_poll": rec.next_poll}
+                for name, rec in self.sources.items()
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            log.warning("[STATE] Save failed: %s (%r)", self.path, exc)
+            return
+        self._dirty = False
+        self._last_save = time()
+        if self.ledger is not None:
+            self.ledger.mark_saved()
+
+
+def from_config(ledger: SentLedger | None) -> StateStore | None:
+    """Build and load the state store described by config, or None if STATE_PATH is unset."""
+    if not config.STATE_PATH:
+        return None
+    store = StateStore(config.STATE_PATH, ledger)
+    store.load()
+    return store
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+
+from . import config
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class RequestTrace:
+    """What the connector did for one request; pass as `trace_request_ctx`."""
+    reused: bool | None = None  # None: no connection event seen (e.g. the request failed before connecting)
+    dns_cached: bool | None = None
+
+
+async def _on_reuse(_session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any) -> None:
+    if isinstance(ctx.trace_request_ctx, RequestTrace):
+        ctx.trace_request_ctx.reused = True
+
+
+async def _on_create(_session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any) -> None:
+    if isinstance(ctx.trace_request_ctx, RequestTrace):
+        ctx.trace_request_ctx.reused = False
+
+
+async def _on_dns_hit(_session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any) -> None:
+    if isinstance(ctx.trace_request_ctx, RequestTrace):
+        ctx.trace_request_ctx.dns_cached = True
+
+
+async def _on_dns_miss(_session: aiohttp.ClientSession, ctx: SimpleNamespace, _params: Any) -> None:
+    if isinstance(ctx.trace_request_ctx, RequestTrace):
+        ctx.trace_request_ctx.dns_cached = False
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_connection_reuseconn.append(_on_reuse)
+    trace.on_connection_create_end.append(_on_create)
+    trace.on_dns_cache_hit.append(_on_dns_hit)
+    trace.on_dns_cache_miss.append(_on_dns_miss)
+    return trace
+
+
+def record(source_name: str, trace: RequestTrace, log: logging.Logger) -> None:
+    """Count and log whether a request reused a pooled connection."""
+    if trace.reused is None:
+        return
+    metrics.HTTP_CONNECTIONS.inc(source=source_name, connection="reused" if trace.reused else "new")
+    log.debug(
+        "[%s] Connection %s (dns %s)",
+        source_name,
+        "reused" if trace.reused else "opened",
+        "n/a" if trace.dns_cached is None else ("cached" if trace.dns_cached else "resolved"),
+    )
+
+
+def accept_encoding() -> str:
+    """Content codings aiohttp can decode here; "br" needs the optional Brotli package."""
+    encodings = ["gzip", "deflate"]
+    if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+        encodings.append("br")
+    return ", ".join(encodings)
+
+
+def keepalive_for(intervals: list[float]) -> float:
+    """
+    Idle keep-alive long enough for a connection to survive until the next
+    poll of the slowest source (plus jitter). HTTP_KEEPALIVE overrides it.
+    """
+    if config.HTTP_KEEPALIVE > 0:
+        return float(config.HTTP_KEEPALIVE)
+    longest = max(intervals, default=60)
+    return longest * (1 + config.SCHEDULE_JITTER) + 5
+
+
+def create_session(intervals: list[float] | None = None) -> aiohttp.ClientSession:
+    """Build the shared HTTP session: pooled keep-alive connections, DNS cache, split timeouts."""
+    keepalive = keepalive_for(intervals or [])
+    connector = aiohttp.TCPConnector(
+        limit=config.HTTP_LIMIT,
+        limit_per_host=config.HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=config.HTTP_DNS_TTL,
+        keepalive_timeout=keepalive,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=config.HTTP_TIMEOUT,
+        connect=config.HTTP_CONNECT_TIMEOUT,
+        sock_read=config.HTTP_READ_TIMEOUT,
+    )
+    encodings = accept_encoding()
+    log.info(
+        "[HTTP] Session created (keepalive=%.0fs, per-host=%d, dns ttl=%ds, timeouts connect=%ss read=%ss total=%ss, encodings=%s)",
+        keepalive, config.HTTP_LIMIT_PER_HOST, config.HTTP_DNS_TTL,
+        config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT, config.HTTP_TIMEOUT, encodings,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={"Accept-Encoding": encodings},
+        trace_configs=[_trace_config()],
+    )
@@ -1,15 +1,34 @@
 from __future__ import annotations
 
+import importlib
 import logging
-
-from mudp import node, conn, send_text_message, send_nodeinfo as _send_nodeinfo
+from functools import lru_cache
 
 from . import config
+from .routes import Route
 
 log = logging.getLogger(__name__)
 
 
+# mudp (and its protobuf/crypto stack) is imported by load(), once, on the
+# Sender's worker thread, so it stays off the startup path.
+
+
+def load() -> None:
+    """
+    Import mudp and the meshtastic protobuf modules.
+
+    Building the protobuf descriptors is not thread-safe, so this must finish
+    before anything else touches mudp or meshtastic (channel hashes on the
+    event loop, the receiver's packet decoding).
+    """
+    for module in ("mudp", "mudp.encryption", "meshtastic.protobuf.mesh_pb2"):
+        importlib.import_module(module)
+
+
 def setup_node() -> None:
+    from mudp import conn, node
+
     # Initialize multicast socket
     conn.setup_multicast(config.MCAST_GRP, config.MCAST_PORT)
     log.info("[UDP] Multicast initialized: %s:%d", config.MCAST_GRP, config.MCAST_PORT)
@@ -23,9 +42,42 @@ def setup_node() -> None:
     log.info("[UDP] Node setup complete: %s (%s)", config.MESHTASTIC_LONG_NAME, config.MESHTASTIC_NODE_ID)
 
 
-def send_text(msg: str, packet_id: int) -> None:
+def _use_identity(route: Route | None) -> None:
+    # mudp reads identity from its global node; callers serialize sends, so swapping it per packet is safe.
+    if route is None:
+        return
+    from mudp import node
+
+    node.node_id = route.node_id
+    node.long_name = route.long_name
+    node.short_name = route.short_name
+    node.channel = route.channel
+    node.key = route.key
+
+
+def send_text(msg: str, packet_id: int, route: Route | None = None) -> None:
+    from mudp import send_text_message
+
+    _use_identity(route)
     send_text_message(msg, hop_limit=config.MESHTASTIC_HOP_LIMIT, packet_id=packet_id)
 
 
-def send_nodeinfo() -> None:
+def send_nodeinfo(route: Route | None = None) -> None:
+    from mudp import send_nodeinfo as _send_nodeinfo
+
+    _use_identity(route)
     _send_nodeinfo(hop_limit=config.MESHTASTIC_HOP_LIMIT)
+
+
+@lru_cache(maxsize=None)
+def _channel_hash(channel: str, key: str) -> int:
+    from mudp.encryption import generate_hash
+
+    return generate_hash(channel, key)
+
+
+def channel_hash(route: Route | None = None) -> int:
+    """Channel number mudp stamps on packets sent for `route` (or the default identity)."""
+    if route is None:
+        return _channel_hash(config.MESHTASTIC_CHANNEL, config.MESHTASTIC_KEY)
+    return _channel_hash(route.channel, route.key)
@@ -1,7 +1,24 @@
 from __future__ import annotations
 import zlib
+from collections.abc import Iterable
+from functools import lru_cache
+from typing import NamedTuple
 from . import config
-from .udp import send_text
+from .routes import Route
+
+# Transmit priority classes, lower is sent first.
+PRIORITY_CRITICAL = 0  # VMA alerts and cancellations
+PRIORITY_HIGH = 1  # SMHI orange/red warnings
+PRIORITY_NORMAL = 2  # SMHI yellow warnings
+PRIORITY_LOW = 3  # exercises and tests
+PRIORITY_BACKGROUND = 4  # nodeinfo
+
+
+class Message(NamedTuple):
+    """One outbound chunk, the priority class of its alert, and the route it is sent on."""
+    text: str
+    priority: int = PRIORITY_NORMAL
+    route: Route | None = None
 
 
 def normalize_message(s: str) -> str:
@@ -9,107 +26,96 @@ def normalize_message(s: str) -> str:
     return " ".join(s.split())
 
 
-def _utf8_prefix(text: str, max_bytes: int) -> tuple[str, str]:
-    """Split text at a UTF-8 safe boundary within max_bytes."""
-    if max_bytes <= 0 or not text:
-        return "", text
+class _ChunkPlan(NamedTuple):
+    """Byte budgets for one (MESHTASTIC_MAX_BYTES, MESHTASTIC_MAX_MESSAGES) setting."""
+    max_bytes: int
+    max_messages: int
+    limit: int  # text bytes per chunk after reserving the worst-case " N/N" suffix
+    last_limit: int  # same for the last allowed chunk, which may also need the ellipsis
 
-    used = 0
-    split_at = 0
-    for idx, char in enumerate(text):
-        char_len = len(char.encode("utf-8"))
-        if used + char_len > max_bytes:
-            break
-        used += char_len
-        split_at = idx + 1
 
-    return text[:split_at], text[split_at:]
+_ELLIPSIS = " [...]"
 
 
-def truncate_utf8(s: str) -> list[str]:
-    """
-    Split a string into Meshtastic-sized chunks, each fitting within
-    MESHTASTIC_MAX_BYTES. Chunks are suffixed with " i/N" numbering.
-    If the whole string fits in one message, it is returned as-is (no suffix).
-    Returns an empty list if MESHTASTIC_MAX_MESSAGES < 1 or the string is empty.
-    """
+@lru_cache(maxsize=8)
+def _chunk_plan(max_bytes: int, max_messages: int) -> _ChunkPlan:
+    suffix_bytes = len(f" {max_messages}/{max_messages}".encode("utf-8"))
+    limit = max(0, max_bytes - suffix_bytes)
+    return _ChunkPlan(max_bytes, max_messages, limit, max(0, limit - len(_ELLIPSIS.encode("utf-8"))))
+
+
+def _chunk(s: str, plan: _ChunkPlan) -> list[str]:
     s = s.strip()
-    if config.MESHTASTIC_MAX_MESSAGES < 1 or not s:
+    if plan.max_messages < 1 or not s:
         return []
 
+    data = s.encode("utf-8")
     # Fast path: already fits in a single message, no suffix needed
-    if len(s.encode("utf-8")) <= config.MESHTASTIC_MAX_BYTES:
+    if len(data) <= plan.max_bytes:
         return [s]
 
-    words = s.split()
-
-    # Reserve worst-case space for " N/N" suffix and optional " [...]" ellipsis
-    suffix_bytes = len(f" {config.MESHTASTIC_MAX_MESSAGES}/{config.MESHTASTIC_MAX_MESSAGES}".encode("utf-8"))
-    ellipsis = " [...]"
-    ellipsis_bytes = len(ellipsis.encode("utf-8"))
+    # Words separated by single spaces, so every b" " in the encoding is a word boundary.
+    # Every whitespace character except " " is non-printable, so printable text without
+    # double spaces needs no normalization.
+    if not s.isprintable() or "  " in s:
+        data = " ".join(s.split()).encode("utf-8")
+    view = memoryview(data)
+    end = len(data)
 
     chunks: list[str] = []
-    i = 0
+    pos = 0
+    for chunk_idx in range(plan.max_messages):
+        is_last = chunk_idx == plan.max_messages - 1
+        limit = plan.last_limit if is_last else plan.limit
 
-    for chunk_idx in range(config.MESHTASTIC_MAX_MESSAGES):
-        is_last = chunk_idx == config.MESHTASTIC_MAX_MESSAGES - 1
-
-        limit = max(0, config.MESHTASTIC_MAX_BYTES - suffix_bytes - (ellipsis_bytes if is_last else 0))
-
-        cur_words: list[str] = []
-        cur_bytes = 0
-
-        while i < len(words):
-            w = words[i]
-            add = len(w.encode("utf-8")) + (0 if not cur_words else 1)
-            if cur_bytes + add <= limit:
-                cur_words.append(w)
-                cur_bytes += add
-                i += 1
-            else:
-                break
-
-        if not cur_words and i < len(words) and limit > 0:
-            head, tail = _utf8_prefix(words[i], limit)
-            if head:
-                cur_words.append(head)
-                if tail:
-                    words[i] = tail
-                else:
-                    i += 1
-
-        if is_last and i < len(words):
-            if cur_words:
-                chunk_text = " ".join(cur_words) + ellipsis
+        if end - pos <= limit:
+            cut = nxt = end
+        else:
+            space = data.rfind(b" ", pos, pos + limit + 1)
+            if space > pos:
+                # Whole words up to the last space within the budget
+                cut, nxt = space, space + 1
             elif limit > 0:
-                # Nothing fit — squeeze a UTF-8-safe partial word so the user sees something
-                partial = words[i].encode("utf-8")[:limit].decode("utf-8", "ignore")
-                chunk_text = (partial + ellipsis).strip()
+                # The next word alone is too long: split it at a UTF-8 character boundary
+                cut = pos + limit
+                while cut > pos and data[cut] & 0xC0 == 0x80:
+                    cut -= 1
+                nxt = cut
             else:
-                chunk_text = ellipsis.strip()
-        else:
-            chunk_text = " ".join(cur_words)
+                cut = nxt = pos
 
-        if not chunk_text and not is_last:
+        text = str(view[pos:cut], "utf-8")
+        if is_last and nxt < end:
+            chunks.append(text + _ELLIPSIS if text else _ELLIPSIS.strip())
             break
-
-        chunks.append(chunk_text)
-
-        if i >= len(words):
+        if not text:
+            break
+        chunks.append(text)
+        pos = nxt
+        if pos >= end:
             break
 
     total = len(chunks)
-    for idx in range(total):
-        chunks[idx] = chunks[idx].strip() + f" {idx + 1}/{total}"
+    return [f"{chunk} {idx}/{total}" for idx, chunk in enumerate(chunks, 1)]
+
+
+def truncate_utf8(s: str) -> list[str]:
+    """
+    Split a string into Meshtastic-sized chunks, each fitting within
+    MESHTASTIC_MAX_BYTES. Chunks are suffixed with " i/N" numbering.
+    If the whole string fits in one message, it is returned as-is (no suffix).
+    Returns an empty list if MESHTASTIC_MAX_MESSAGES < 1 or the string is empty.
+    """
+    return _chunk(s, _chunk_plan(config.MESHTASTIC_MAX_BYTES, config.MESHTASTIC_MAX_MESSAGES))
+
+
+def truncate_utf8_many(texts: Iterable[str]) -> list[list[str]]:
+    """Chunk many messages with one settings lookup; same output as truncate_utf8 per text."""
+    plan = _chunk_plan(config.MESHTASTIC_MAX_BYTES, config.MESHTASTIC_MAX_MESSAGES)
+    return [_chunk(s, plan) for s in texts]
 
-    return chunks
 
 def make_message_id(s: str) -> int:
     """Generate a deterministic 32-bit Meshtastic packet ID from a string."""
     return zlib.crc32(s.encode("utf-8")) & 0xFFFFFFFF
 
-
-def send_message(s: str) -> None:
-    """Normalize a message, derive its packet ID, and send it."""
-    normalized = normalize_message(s)
-    send_text(normalized, packet_id=make_message_id(normalized))
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+from . import config
+from . import metrics
+from .routes import ROUTES
+from .sources.jsonstream import ArrayItemSplitter
+from .sources.registry import SourceSpec
+from .util import Message
+
+log = logging.getLogger(__name__)
+
+# Workers are spawned rather than forked: the daemon already runs threads (sender, log writer) at that point.
+_CONTEXT = multiprocessing.get_context("spawn")
+
+# Log records from all worker processes, re-emitted by the parent's handlers (sampling included).
+_log_queue: Any = None
+
+# A rendered message as it crosses the process boundary: routes travel by name.
+_WireMessage = tuple[str, int, str | None]
+
+
+class _Relay(logging.Handler):
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def _relay_logs() -> Any:
+    global _log_queue
+    if _log_queue is None:
+        _log_queue = _CONTEXT.Queue()
+        listener = QueueListener(_log_queue, _Relay())
+        listener.start()
+        atexit.register(listener.stop)
+    return _log_queue
+
+
+def _init_worker(queue: Any, level: int) -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(queue))
+    root.setLevel(level)
+
+
+def _decode(stream_item: Callable[[bytes], Any] | None, body: bytes) -> Any:
+    """Decode a raw payload, item by item through `stream_item` if the source streams."""
+    if stream_item is None:
+        return json.loads(body)
+    splitter = ArrayItemSplitter()
+    data = [item for item in map(stream_item, splitter.feed(body)) if item is not None]
+    splitter.close()
+    return data
+
+
+def _decode_and_parse(
+    parse: Callable[[Any], list[Message]],
+    stream_item: Callable[[bytes], Any] | None,
+    body: bytes,
+) -> tuple[list[_WireMessage], float]:
+    """Worker side: decode and parse a payload, timing both."""
+    started = time.perf_counter()
+    msgs = parse(_decode(stream_item, body))
+    wire = [(m.text, m.priority, m.route.name if m.route is not None else None) for m in msgs]
+    return wire, time.perf_counter() - started
+
+
+class ParseWorker:
+    """
+    Runs one source's decode and parse stage in a dedicated worker process.
+
+    Raw response bytes go in; rendered messages come back, with their routes
+    mapped to this process's Route objects. The source's render caches live in
+    the worker and persist across polls. If the worker dies, the poll fails and
+    the next one starts a new worker. When restarts reach `restart_history`
+    within `max_interval` seconds (the supervised_task limits), the source
+    falls back to parsing in the daemon process.
+    """
+
+    def __init__(
+        self,
+        spec: SourceSpec,
+        restart_history: int = config.RESTART_HISTORY,
+        max_interval: int = config.MAX_RESTART_INTERVAL,
+    ) -> None:
+        self.spec = spec
+        self.restart_history = restart_history
+        self.max_interval = max_interval
+        self.enabled = True
+        self._pool: ProcessPoolExecutor | None = None
+        self._starts: deque[float] = deque(maxlen=restart_history)
+        self._routes = {route.name: route for route in ROUTES}
+
+    @property
+    def label(self) -> str:
+        return f"parse:{self.spec.name.lower()}"
+
+    def _start(self) -> ProcessPoolExecutor | None:
+        now = time.monotonic()
+        restarts_in_window = sum(1 for ts in self._starts if now - ts <= self.max_interval)
+        if restarts_in_window >= self.restart_history:
+            self.enabled = False
+            log.error(
+                "[WORKER] Worker restart limit reached: %s (%d failures in %ds); parsing in process",
+                self.label, self.restart_history, self.max_interval,
+            )
+            return None
+        self._starts.append(now)
+        self._pool = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=_CONTEXT,
+            initializer=_init_worker,
+            initargs=(_relay_logs(), logging.getLogger().level),
+        )
+        log.info("[WORKER] Worker started: %s", self.label)
+        return self._pool
+
+    async def parse(self, body: bytes) -> tuple[list[Message], float]:
+        """Decode and parse `body`, in the worker while it is enabled. Returns the messages and the parse time."""
+        pool = self._pool
+        if pool is None and self.enabled:
+            pool = self._start()
+        if pool is None:
+            started = time.perf_counter()
+            msgs = self.spec.parse(_decode(self.spec.stream_item, body))
+            return msgs, time.perf_counter() - started
+        try:
+            wire, elapsed = await asyncio.get_running_loop().run_in_executor(
+                pool, _decode_and_parse, self.spec.parse, self.spec.stream_item, body,
+            )
+        except BrokenProcessPool:
+            self._pool = None
+            pool.shutdown(wait=False)
+            metrics.TASK_RESTARTS.inc(task=self.label)
+            log.error("[WORKER] Worker crashed: %s; restarting on the next poll", self.label)
+            raise
+        routes = self._routes
+        return [Message(text, priority, routes.get(name) if name is not None else None)
+                for text, priority, name in wire], elapsed
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
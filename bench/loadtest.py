@@ -0,0 +1,480 @@
+"""
+End-to-end load test: run the real daemon (python -m app.main) against local
+stand-ins for the VMA and SMHI APIs and capture what it puts on the multicast
+group.
+
+    python -m bench.loadtest                                   # regional, 60s, 1 new VMA alert/s
+    python -m bench.loadtest -s nationwide --rate 5 --duration 120
+    python -m bench.loadtest --latency 200 --error-rate 0.2   # slow, flaky upstream (retry path)
+    python -m bench.loadtest --block-receiver 8               # receiver crashes and restarts (supervised_task)
+    python -m bench.loadtest --env PARSE_WORKERS=SMHI --json out.json
+
+The stand-in VMA feed serves the scenario's alerts plus new alerts injected at
+`--rate` per second, each carrying a unique token. The multicast sink decrypts
+every packet with the channel key and matches the tokens, so alert-to-packet
+latency is measured from the moment an alert is published upstream to the
+moment its first chunk is received (poll interval included). SMHI serves the
+scenario's warning.json as background load. Both answer 304 to matching
+ETags unless --no-etag is set; --latency, --error-rate and --retry-after shape
+the responses.
+
+The daemon sends to MESHTASTIC_MCAST_GRP on --port, 44030 by default, so that
+Meshtastic nodes on the LAN (which listen on 4403) ignore the traffic. Polling
+runs every --poll seconds, warmup is off, and the airtime budget is disabled
+unless --airtime is given. Other settings can be overridden with --env. The
+report covers:
+- latency percentiles and packets/s
+- upstream responses by status
+- retries, failures and task restarts scraped from /metrics
+- CPU time and peak RSS of the daemon and its worker processes
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import signal
+import socket
+import statistics
+import struct
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from app import config
+
+from . import payloads
+
+_TOKEN = re.compile(r"LT(\d{6})")
+_TEXT_MESSAGE_APP = 1
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Upstream:
+    """Local VMA and SMHI stand-ins with injectable alerts, latency, errors and 304s."""
+
+    def __init__(
+        self,
+        vma_alerts: list[dict[str, Any]],
+        smhi_body: bytes,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float | None = None,
+        etag: bool = True,
+        seed: int = 1,
+    ) -> None:
+        self.vma_alerts = vma_alerts
+        self.smhi_body = smhi_body
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.etag = etag
+        self.rng = random.Random(seed)
+        self.responses: Counter[tuple[str, int]] = Counter()
+        self.published: dict[int, float] = {}  # token -> monotonic time the alert first appeared in the feed
+        self._vma_body = b""
+        self._encode_vma()
+
+    def _encode_vma(self) -> None:
+        self._vma_body = json.dumps({"alerts": self.vma_alerts}, ensure_ascii=False).encode("utf-8")
+
+    def inject(self) -> int:
+        """Publish a new VMA alert with a unique token; returns the token."""
+        token = len(self.published) + 1
+        self.vma_alerts.append({
+            "identifier": f"LOADTEST-{token:06d}",
+            "sent": "2025-10-26T12:00:00+01:00",
+            "status": "Actual",
+            "msgType": "Alert",
+            "scope": "Public",
+            "info": [{
+                "event": "Viktigt meddelande till allmänheten (VMA)",
+                "description": f"LT{token:06d} Gå inomhus och stäng dörrar, fönster och ventilation.",
+                "area": [{"areaDesc": "Stockholms län", "geocode": [{"valueName": "Län", "value": "01"}]}],
+            }],
+        })
+        self._encode_vma()
+        self.published[token] = time.monotonic()
+        return token
+
+    async def _serve(self, request: web.Request, source: str, body: bytes) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.responses[(source, 503)] += 1
+            headers = {"Retry-After": f"{self.retry_after:g}"} if self.retry_after is not None else None
+            return web.Response(status=503, headers=headers)
+        tag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        if self.etag and request.headers.get("If-None-Match") == tag:
+            self.responses[(source, 304)] += 1
+            return web.Response(status=304, headers={"ETag": tag})
+        self.responses[(source, 200)] += 1
+        headers = {"ETag": tag} if self.etag else None
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    async def start(self) -> tuple[web.AppRunner, str]:
+        async def vma(request: web.Request) -> web.Response:
+            return await self._serve(request, "VMA", self._vma_body)
+
+        async def smhi(request: web.Request) -> web.Response:
+            return await self._serve(request, "SMHI", self.smhi_body)
+
+        app = web.Application()
+        app.router.add_get("/vma", vma)
+        app.router.add_get("/smhi", smhi)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        port = _free_port()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner, f"http://127.0.0.1:{port}"
+
+
+class Sink(asyncio.DatagramProtocol):
+    """Receives the daemon's packets from the multicast group and decrypts their text."""
+
+    def __init__(self, key: str) -> None:
+        from meshtastic.protobuf import mesh_pb2
+        from mudp.encryption import decrypt_packet
+
+        self._packet = mesh_pb2.MeshPacket
+        self._decrypt = decrypt_packet
+        self.key = key
+        self.packets = 0
+        self.text_packets = 0
+        self.ids: Counter[int] = Counter()
+        self.delivered: dict[int, float] = {}  # token -> monotonic time of its first packet
+        self.first: float | None = None
+        self.last: float | None = None
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        now = time.monotonic()
+        packet = self._packet()
+        try:
+            packet.ParseFromString(data)
+        except Exception:
+            return
+        self.packets += 1
+        self.ids[packet.id] += 1
+        decoded = self._decrypt(packet, self.key, silent=True) if packet.encrypted else packet.decoded
+        if decoded is None or decoded.portnum != _TEXT_MESSAGE_APP:
+            return
+        self.text_packets += 1
+        self.first = now if self.first is None else self.first
+        self.last = now
+        match = _TOKEN.search(decoded.payload.decode("utf-8", "replace"))
+        if match:
+            self.delivered.setdefault(int(match.group(1)), now)
+
+
+def _multicast_socket(group: str, port: int) -> socket.socket:
+    # Bound to the group address, so a --block-receiver socket on 127.0.0.1 can still hold the wildcard bind.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((group, port))
+    mreq = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton("0.0.0.0"))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    sock.setblocking(False)
+    return sock
+
+
+class ProcessSampler:
+    """CPU time and peak RSS of a process and its children, from /proc (Linux)."""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.cpu: dict[int, float] = {}
+        self.peak_rss = 0
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _tree(self) -> list[int]:
+        pids = [self.pid]
+        try:
+            for entry in os.listdir("/proc"):
+                if entry.isdigit():
+                    with open(f"/proc/{entry}/stat", "rb") as f:
+                        fields = f.read().rsplit(b")", 1)[1].split()
+                    if int(fields[1]) == self.pid:
+                        pids.append(int(entry))
+        except OSError:
+            pass
+        return pids
+
+    def sample(self) -> None:
+        rss = 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat", "rb") as f:
+                    fields = f.read().rsplit(b")", 1)[1].split()
+                self.cpu[pid] = (int(fields[11]) + int(fields[12])) / self._tick
+                with open(f"/proc/{pid}/status") as f:
+                    rss += next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+            except (OSError, ValueError, IndexError):
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    async def run(self, interval: float = 0.5) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+
+def _scrape(text: str) -> dict[str, float]:
+    """Sum Prometheus samples per metric name (labels folded), plus per-task restarts."""
+    out: dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        metric = name.split("{", 1)[0]
+        try:
+            out[metric] = out.get(metric, 0.0) + float(value)
+        except ValueError:
+            continue
+        if metric == "meshdaemon_task_restarts_total":
+            task = re.search(r'task="([^"]*)"', name)
+            if task:
+                out[f"restarts:{task.group(1)}"] = float(value)
+    return out
+
+
+async def _get(session: aiohttp.ClientSession, url: str) -> tuple[int, str]:
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            return resp.status, await resp.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return 0, ""
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    smhi_body, vma_body = payloads.load(args.scenario)
+    if args.smhi_alerts is not None:
+        _, areas, points, _ = payloads.SCENARIOS.get(args.scenario, (0, 8, 120, 0))
+        smhi_body = json.dumps(payloads.smhi_payload(
+            args.smhi_alerts, args.areas or areas, args.points or points, args.seed,
+        )).encode()
+    vma_alerts = json.loads(vma_body).get("alerts") or []
+    upstream = Upstream(
+        vma_alerts, smhi_body, latency=args.latency / 1000, error_rate=args.error_rate,
+        retry_after=args.retry_after, etag=not args.no_etag, seed=args.seed,
+    )
+    runner, base = await upstream.start()
+
+    loop = asyncio.get_running_loop()
+    key = os.environ.get("MESHTASTIC_KEY", config.MESHTASTIC_KEY)
+    sink = Sink(key)
+    sink_transport, _ = await loop.create_datagram_endpoint(lambda: sink, sock=_multicast_socket(args.group, args.port))
+
+    blocker: socket.socket | None = None
+    if args.block_receiver:
+        # Holds the port without SO_REUSEADDR, so the daemon's receiver fails to bind until it is released.
+        blocker = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        blocker.bind(("127.0.0.1", args.port))
+
+    metrics_port = _free_port()
+    env = {
+        **os.environ,
+        "VMA_URL": f"{base}/vma",
+        "SMHI_URL": f"{base}/smhi",
+        "VMA_INTERVAL": str(args.poll), "VMA_MIN_INTERVAL": str(args.poll), "VMA_MAX_INTERVAL": str(args.poll),
+        "SMHI_INTERVAL": str(args.poll), "SMHI_MIN_INTERVAL": str(args.poll), "SMHI_MAX_INTERVAL": str(args.poll),
+        "MESHTASTIC_MCAST_GRP": args.group,
+        "MESHTASTIC_MCAST_PORT": str(args.port),
+        "METRICS_PORT": str(metrics_port),
+        "METRICS_HOST": "127.0.0.1",
+        "WARMUP": "0",
+        "STATE_PATH": "",
+        "COORDINATION": "0",
+        "SOURCE_ENTRY_POINTS": "0",
+        "TX_AIRTIME_RATE": os.environ.get("TX_AIRTIME_RATE", "0.1") if args.airtime else "0",
+    }
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+
+    log_file = open(args.log, "wb") if args.log else None  # closed once the daemon has exited
+    started = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "app.main", env=env,
+        stdout=log_file or asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.STDOUT,
+    )
+    sampler = ProcessSampler(proc.pid)
+    sampling = asyncio.create_task(sampler.run())
+    print(f"daemon pid {proc.pid}, upstream {base}, multicast {args.group}:{args.port}, metrics :{metrics_port}",
+          file=sys.stderr)
+
+    async def inject() -> None:
+        if args.rate <= 0:
+            return
+        while time.monotonic() - started < args.duration:
+            upstream.inject()
+            await asyncio.sleep(1 / args.rate)
+
+    async def unblock() -> None:
+        if blocker is not None:
+            await asyncio.sleep(args.block_receiver)
+            blocker.close()
+
+    injecting = asyncio.create_task(inject())
+    unblocking = asyncio.create_task(unblock())
+    exited = asyncio.create_task(proc.wait())
+    await asyncio.wait([exited], timeout=args.duration)
+    if not exited.done():
+        # Let the last injected alerts get polled and sent.
+        deadline = time.monotonic() + args.drain
+        while time.monotonic() < deadline and len(sink.delivered) < len(upstream.published) and not exited.done():
+            await asyncio.sleep(0.2)
+    injecting.cancel()
+    unblocking.cancel()
+    if blocker is not None:
+        blocker.close()
+
+    metrics: dict[str, float] = {}
+    health: dict[str, Any] | None = None
+    async with aiohttp.ClientSession() as session:
+        status, text = await _get(session, f"http://127.0.0.1:{metrics_port}/metrics")
+        if status == 200:
+            metrics = _scrape(text)
+        status, text = await _get(session, f"http://127.0.0.1:{metrics_port}/healthz")
+        if text:
+            health = json.loads(text)
+    sampler.sample()
+    wall = time.monotonic() - started
+
+    if not exited.done():
+        proc.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(exited, 30)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await exited
+    sampling.cancel()
+    await asyncio.gather(injecting, unblocking, sampling, return_exceptions=True)
+    sink_transport.close()
+    await runner.cleanup()
+    if log_file is not None:
+        log_file.close()
+
+    latencies = [(sink.delivered[t] - upstream.published[t]) * 1000 for t in upstream.published if t in sink.delivered]
+    span = (sink.last - sink.first) if sink.first is not None and sink.last is not None else 0.0
+    cpu = sum(sampler.cpu.values())
+    return {
+        "scenario": args.scenario,
+        "duration_s": round(wall, 1),
+        "exit_code": proc.returncode,
+        "alerts": {
+            "published": len(upstream.published),
+            "delivered": len(latencies),
+            "lost": len(upstream.published) - len(latencies),
+        },
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.5),
+            "p90": _percentile(latencies, 0.9),
+            "p99": _percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+            "mean": statistics.fmean(latencies) if latencies else None,
+        },
+        "packets": {
+            "received": sink.packets,
+            "text": sink.text_packets,
+            "unique_ids": len(sink.ids),
+            "duplicate_ids": sum(n - 1 for n in sink.ids.values() if n > 1),
+            "per_s": round(sink.text_packets / span, 2) if span > 0 else None,
+        },
+        "upstream": {f"{source} {status}": n for (source, status), n in sorted(upstream.responses.items())},
+        "daemon": {
+            "cpu_s": round(cpu, 2),
+            "cpu_pct": round(100 * cpu / wall, 1) if wall else None,
+            "peak_rss_mib": round(sampler.peak_rss / 1024, 1),
+            "processes": len(sampler.cpu),
+            "fetch_retries": metrics.get("meshdaemon_fetch_retries_total"),
+            "fetch_failures": metrics.get("meshdaemon_fetch_failures_total"),
+            "fetch_skipped": metrics.get("meshdaemon_fetch_skipped_total"),
+            "task_restarts": {k.split(":", 1)[1]: v for k, v in metrics.items() if k.startswith("restarts:")},
+            "health": health,
+        },
+    }
+
+
+def _fmt(value: float | None, unit: str = "") -> str:
+    return "-" if value is None else f"{value:.0f}{unit}"
+
+
+def _print(report: dict[str, Any]) -> None:
+    alerts, lat, packets, daemon = report["alerts"], report["latency_ms"], report["packets"], report["daemon"]
+    print(f"\n== loadtest {report['scenario']} ({report['duration_s']}s, daemon exit {report['exit_code']}) ==")
+    print(f"alerts     published={alerts['published']} delivered={alerts['delivered']} lost={alerts['lost']}")
+    print(f"latency    p50={_fmt(lat['p50'], 'ms')} p90={_fmt(lat['p90'], 'ms')} p99={_fmt(lat['p99'], 'ms')} "
+          f"max={_fmt(lat['max'], 'ms')}")
+    print(f"packets    received={packets['received']} text={packets['text']} unique_ids={packets['unique_ids']} "
+          f"duplicates={packets['duplicate_ids']} rate={packets['per_s'] or '-'}/s")
+    print(f"upstream   {', '.join(f'{k}: {v}' for k, v in report['upstream'].items()) or '-'}")
+    print(f"daemon     cpu={daemon['cpu_s']}s ({daemon['cpu_pct']}%) peak_rss={daemon['peak_rss_mib']}MiB "
+          f"processes={daemon['processes']}")
+    print(f"fetches    retries={_fmt(daemon['fetch_retries'])} failures={_fmt(daemon['fetch_failures'])} "
+          f"skipped={_fmt(daemon['fetch_skipped'])}")
+    restarts = ", ".join(f"{task}: {n:.0f}" for task, n in daemon["task_restarts"].items())
+    print(f"restarts   {restarts or 'none'}")
+    health = daemon["health"]
+    if health is not None:
+        print(f"health     live={health['live']} ready={health['ready']} {'; '.join(health['reasons'])}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.loadtest", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", default="regional", help="payload scenario or fixture set (default regional)")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to inject alerts (default 60)")
+    parser.add_argument("--drain", type=float, default=15, help="extra seconds to wait for the last alerts (default 15)")
+    parser.add_argument("--rate", type=float, default=1.0, help="new VMA alerts per second (default 1, 0 = none)")
+    parser.add_argument("--poll", type=int, default=1, help="poll interval of both sources in seconds (default 1)")
+    parser.add_argument("--smhi-alerts", type=int, help="synthetic SMHI alerts instead of the scenario's")
+    parser.add_argument("--areas", type=int, help="warning areas per SMHI alert (with --smhi-alerts)")
+    parser.add_argument("--points", type=int, help="polygon points per warning area (with --smhi-alerts)")
+    parser.add_argument("--latency", type=float, default=0, help="mean upstream response latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of upstream responses that are 503")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with 503 responses")
+    parser.add_argument("--no-etag", action="store_true", help="never answer 304 Not Modified")
+    parser.add_argument("--airtime", action="store_true", help="keep the daemon's airtime budget (default: disabled)")
+    parser.add_argument("--block-receiver", type=float, default=0, metavar="SECONDS",
+                        help="hold the multicast port so the receiver task crashes and restarts for SECONDS")
+    parser.add_argument("--group", default=config.MCAST_GRP, help="multicast group (default MESHTASTIC_MCAST_GRP)")
+    parser.add_argument("--port", type=int, default=44030, help="multicast port for the test (default 44030)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra daemon setting")
+    parser.add_argument("--log", type=Path, help="write the daemon's output to this file")
+    parser.add_argument("--json", type=Path, help="write the report as JSON")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    _print(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        print(f"report written to {args.json}")
+    return 0 if report["alerts"]["lost"] == 0 and report["exit_code"] in (0, -signal.SIGTERM) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# (SMHI alerts, warning areas per alert, polygon points per area, VMA alerts)
+SCENARIOS: dict[str, tuple[int, int, int, int]] = {
+    "quiet": (3, 1, 40, 0),
+    "regional": (40, 8, 120, 3),
+    "nationwide": (320, 12, 200, 25),
+}
+
+_LEVELS = (("YELLOW", "Gul"), ("ORANGE", "Orange"), ("RED", "Röd"), ("MESSAGE", "Meddelande"))
+_EVENTS = ("Kraftigt regn", "Kraftig vind", "Snöfall", "Höga flöden", "Brandrisk", "Åska")
+_DIRECTIONS = ("norra", "södra", "östra", "västra", "nordöstra", "sydvästra", "centrala")
+_PLACES = ("Stockholms län", "Uppsala län", "Gotland", "Jämtlandsfjällen", "Västra Götaland", "Skåne")
+_COUNTIES = ("01", "03", "04", "05", "06", "07", "08", "09", "10", "12", "13", "14", "17", "18", "19", "20", "21",
+             "22", "23", "24", "25")
+
+
+def _polygon(rng: random.Random, points: int) -> dict[str, Any]:
+    lon, lat = rng.uniform(11, 24), rng.uniform(55, 69)
+    ring = [[round(lon + rng.uniform(-1, 1), 6), round(lat + rng.uniform(-1, 1), 6)] for _ in range(points)]
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def smhi_payload(alerts: int, areas: int, points: int, seed: int = 1) -> list[dict[str, Any]]:
+    """Synthetic SMHI warning.json: `alerts` alerts with `areas` warning areas each."""
+    rng = random.Random(seed)
+    now = datetime(2025, 10, 26, 0, 30, tzinfo=timezone.utc)  # spans the DST change
+    out: list[dict[str, Any]] = []
+    for a in range(alerts):
+        event = rng.choice(_EVENTS)
+        # Areas of one alert mostly share its time range, as in the real feed; a few start later or end sooner.
+        alert_start = now + timedelta(hours=rng.randint(-6, 48))
+        alert_end = alert_start + timedelta(hours=rng.randint(2, 60))
+        warning_areas = []
+        for w in range(areas):
+            code, sv = rng.choice(_LEVELS)
+            start, end = alert_start, alert_end
+            if rng.random() < 0.2:
+                start += timedelta(hours=rng.randint(1, 6))
+                end = max(end - timedelta(hours=rng.randint(0, 6)), start + timedelta(hours=1))
+            place = f"{rng.choice(_DIRECTIONS)} {rng.choice(_PLACES)}"
+            warning_areas.append({
+                "id": a * 100 + w,
+                "approximateStart": start.isoformat().replace("+00:00", "Z"),
+                "approximateEnd": end.isoformat().replace("+00:00", "Z"),
+                "published": now.isoformat().replace("+00:00", "Z"),
+                "warningLevel": {"sv": sv, "en": code.title(), "code": code},
+                "eventDescription": {"sv": event, "en": event, "code": event.upper().replace(" ", "_")},
+                "affectedAreas": [{"id": rng.randint(1, 40), "sv": place, "en": place} for _ in range(rng.randint(1, 4))],
+                "descriptions": [{"title": {"sv": "Vad händer"}, "text": {"sv": f"{event} väntas i {place}. " * 4}}],
+                "area": {"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": _polygon(rng, points)}]},
+                "areaName": {"sv": place, "en": place},
+            })
+        out.append({
+            "id": 5000 + a,
+            "normalProbability": True,
+            "event": {"sv": event, "en": event, "code": event.upper().replace(" ", "_")},
+            "descriptions": [],
+            "warningAreas": warning_areas,
+        })
+    return out
+
+
+def vma_payload(alerts: int, seed: int = 1) -> dict[str, Any]:
+    """Synthetic VMA v3 response with `alerts` alerts spread over the counties."""
+    rng = random.Random(seed)
+    out: list[dict[str, Any]] = []
+    for a in range(alerts):
+        status = rng.choice(("Actual", "Actual", "Actual", "Exercise", "Test"))
+        county = rng.choice(_COUNTIES)
+        description = (
+            f"Viktigt meddelande till allmänheten i {rng.choice(_PLACES)}. "
+            "Det brinner i en industribyggnad och kraftig rök sprids. Gå inomhus och stäng dörrar, fönster och "
+            "ventilation. Lyssna på Sveriges Radio P4 för mer information. " * rng.randint(1, 3)
+        )
+        out.append({
+            "identifier": f"SRVMA-{a:05d}",
+            "sender": "https://vmaapi.sr.se",
+            "sent": f"2025-10-26T{a % 24:02d}:15:00+01:00",
+            "status": status,
+            "msgType": rng.choice(("Alert", "Alert", "Update", "Cancel")),
+            "scope": "Public",
+            "info": [{
+                "language": "sv-SE",
+                "category": "Safety",
+                "event": "Viktigt meddelande till allmänheten (VMA)",
+                "urgency": "Immediate",
+                "severity": "Severe",
+                "certainty": "Observed",
+                "description": description,
+                "area": [{
+                    "areaDesc": rng.choice(_PLACES),
+                    "geocode": [{"valueName": "Kommun", "value": f"{county}{rng.randint(10, 99)}"}],
+                }],
+            }],
+        })
+    return {"alerts": out}
+
+
+def timeline(scenario: str, hours: float, step: float = 600, seed: int = 1) -> list[dict[str, Any]]:
+    """
+    Synthetic recording for bench.replay: the scenario's alerts appear and
+    expire at random over `hours`, sampled every `step` seconds. A record
+    ({"t", "source", "status", "body"}) is emitted whenever a source's payload
+    changes, and an occasional 503 simulates an upstream outage.
+    """
+    alerts, areas, points, vma_alerts = SCENARIOS[scenario]
+    rng = random.Random(seed)
+    t0 = datetime(2025, 10, 26, tzinfo=timezone.utc).timestamp()
+    span = hours * 3600
+    smhi_all = smhi_payload(alerts, areas, points, seed)
+    vma_all = vma_payload(vma_alerts, seed)["alerts"]
+
+    def windows(n: int) -> list[tuple[float, float]]:
+        out = []
+        for _ in range(n):
+            start = rng.uniform(-0.2, 0.9) * span
+            out.append((start, start + rng.uniform(0.05, 0.5) * span))
+        return out
+
+    smhi_windows, vma_windows = windows(len(smhi_all)), windows(len(vma_all))
+    records: list[dict[str, Any]] = []
+    last: dict[str, tuple[int, ...] | None] = {"SMHI": None, "VMA": None}
+    t = 0.0
+    while t <= span:
+        for source, items, wins in (("SMHI", smhi_all, smhi_windows), ("VMA", vma_all, vma_windows)):
+            if rng.random() < 0.01:
+                records.append({"t": t0 + t, "source": source, "status": 503, "body": None})
+                last[source] = None
+                continue
+            active = tuple(i for i, (start, end) in enumerate(wins) if start <= t < end)
+            if active == last[source]:
+                continue
+            last[source] = active
+            selected = [items[i] for i in active]
+            body = selected if source == "SMHI" else {"alerts": selected}
+            records.append({"t": t0 + t, "source": source, "status": 200, "body": body})
+        t += step
+    return records
+
+
+def load(scenario: str) -> tuple[bytes, bytes]:
+    """
+    Return the (SMHI, VMA) bodies for a scenario. Captured payloads in
+    fixtures/<scenario>.smhi.json / <scenario>.vma.json take precedence over
+    the synthetic ones.
+    """
+    smhi_path = FIXTURES_DIR / f"{scenario}.smhi.json"
+    vma_path = FIXTURES_DIR / f"{scenario}.vma.json"
+    if scenario in SCENARIOS:
+        alerts, areas, points, vma_alerts = SCENARIOS[scenario]
+        smhi = smhi_path.read_bytes() if smhi_path.exists() else json.dumps(smhi_payload(alerts, areas, points)).encode()
+        vma = vma_path.read_bytes() if vma_path.exists() else json.dumps(vma_payload(vma_alerts)).encode()
+        return smhi, vma
+    if not smhi_path.exists() and not vma_path.exists():
+        raise KeyError(f"unknown scenario {scenario!r} (no synthetic profile or fixture)")
+    smhi = smhi_path.read_bytes() if smhi_path.exists() else b"[]"
+    vma = vma_path.read_bytes() if vma_path.exists() else b'{"alerts": []}'
+    return smhi, vma
+
+
+def scenarios() -> list[str]:
+    """Synthetic scenarios plus any captured fixture sets."""
+    names = list(SCENARIOS)
+    if FIXTURES_DIR.is_dir():
+        for path in sorted(FIXTURES_DIR.glob("*.json")):
+            name = path.name.split(".", 1)[0]
+            if name not in names:
+                names.append(name)
+    return names
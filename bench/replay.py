@@ -0,0 +1,402 @@
+"""
+Replay recorded SMHI/VMA responses through the full pipeline (scheduler >
+poll_source > ledger > Sender > udp.send_text) on a virtual clock, without
+network or mudp, and report every packet that would have gone out.
+
+    python -m bench.replay --synthetic nationwide --hours 168     # a synthetic storm week
+    python -m bench.replay recording.jsonl.gz --report out.json   # a recorded day
+    python -m bench.replay recording.jsonl.gz --compare out.json  # exit 1 if the packets changed
+    python -m bench.replay --record recording.jsonl.gz --hours 24 # record live responses
+
+A recording is JSON lines, optionally gzipped: {"t": <unix time>, "source":
+"SMHI", "status": 200, "body": <decoded JSON>}. A poll at virtual time T gets
+the latest record of its source with t <= T (a status >= 400 fails the fetch),
+and a repeat of the same record is answered as 304 Not Modified. Configuration
+(intervals, routes, ledger, warmup, airtime budget, ...) comes from the usual
+environment variables.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import gzip
+import heapq
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any
+from unittest import mock
+
+from app import airtime, config, ledger as sent_ledger, sender as sender_module, transport, udp
+from app.routes import Route
+from app.scheduler import SourceScheduler
+from app.sender import Sender
+from app.sources import common
+from app.sources.registry import SourceSpec, load_sources
+
+from . import payloads
+
+log = logging.getLogger("bench.replay")
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop on a virtual clock: whenever no callback is ready, time jumps to
+    the next scheduled timer instead of waiting for it. Relies on the
+    (long-stable) `_ready` / `_scheduled` internals of asyncio's base loop.
+
+    Loop time starts at 0: at Unix-epoch magnitudes a float cannot resolve the
+    loop's clock resolution, and due timers would never fire. `wall()` gives
+    the matching Unix time.
+    """
+
+    def __init__(self, start: float) -> None:
+        super().__init__()
+        self.epoch = start
+        self._now = 0.0
+
+    def time(self) -> float:
+        return self._now
+
+    def wall(self) -> float:
+        return self.epoch + self._now
+
+    def _run_once(self) -> None:
+        scheduled = self._scheduled
+        while scheduled and scheduled[0]._cancelled:
+            # Drop cancelled timers first so the clock never jumps to a timeout that no longer exists.
+            self._timer_cancelled_count -= 1
+            handle = heapq.heappop(scheduled)
+            handle._scheduled = False
+        if not self._ready and scheduled and scheduled[0].when() > self._now:
+            self._now = scheduled[0].when()
+        super()._run_once()
+
+
+class _InlineExecutor(Executor):
+    """Runs submitted calls immediately, so sends never wait on a thread while the clock jumps."""
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future[Any]:
+        future: Future[Any] = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+@dataclass
+class Record:
+    t: float
+    source: str
+    status: int
+    body: Any
+
+
+def _open(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore[return-value]
+    return open(path, mode, encoding="utf-8")
+
+
+def read_recording(path: Path) -> list[Record]:
+    records: list[Record] = []
+    with _open(path, "r") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+                records.append(Record(float(raw["t"]), str(raw["source"]), int(raw.get("status", 200)), raw.get("body")))
+            except (ValueError, KeyError, TypeError) as exc:
+                raise SystemExit(f"{path}:{n}: invalid record ({exc})")
+    return sorted(records, key=lambda r: r.t)
+
+
+class RecordedUpstream:
+    """Stands in for fetch_json_with_retries, serving each source's recorded responses by virtual time."""
+
+    def __init__(self, records: list[Record], clock: Callable[[], float]) -> None:
+        self.clock = clock
+        self._records: dict[str, list[Record]] = {}
+        for rec in records:
+            self._records.setdefault(rec.source, []).append(rec)
+        self._times = {name: [r.t for r in recs] for name, recs in self._records.items()}
+        self._served: dict[str, Record] = {}
+        self.fetches: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        self.not_modified: Counter[str] = Counter()
+
+    async def fetch(
+        self,
+        _session: Any,
+        url: str,
+        *,
+        source_name: str,
+        log: logging.Logger,
+        params: dict[str, Any] | None = None,
+        conditional: bool = False,
+        stream_item: Callable[[bytes], Any] | None = None,
+        meta: common.ResponseMeta | None = None,
+        **_kwargs: Any,
+    ) -> Any | None:
+        self.fetches[source_name] += 1
+        times = self._times.get(source_name, [])
+        idx = bisect.bisect_right(times, self.clock()) - 1
+        if idx < 0 or self._records[source_name][idx].status >= 400:
+            self.failures[source_name] += 1
+            log.debug("[%s] Replay: no usable record, fetch failed", source_name)
+            return None
+        rec = self._records[source_name][idx]
+        if meta is not None:
+            meta.status = rec.status
+        key = common._cache_key(url, params)
+        if conditional and self._served.get(key) is rec:
+            self.not_modified[source_name] += 1
+            return common.NOT_MODIFIED
+        self._served[key] = rec
+        if stream_item is not None:
+            kept = (stream_item(json.dumps(item).encode("utf-8")) for item in rec.body or [])
+            return [item for item in kept if item is not None]
+        return rec.body
+
+
+@dataclass
+class Packet:
+    t: float
+    kind: str  # text or nodeinfo
+    packet_id: int | None
+    route: str
+    text: str
+
+
+class CaptureSink:
+    """Replaces udp.send_text / udp.send_nodeinfo and records what would have been transmitted."""
+
+    def __init__(self, clock: Callable[[], float]) -> None:
+        self.clock = clock
+        self.packets: list[Packet] = []
+
+    def send_text(self, msg: str, packet_id: int, route: Route | None = None) -> None:
+        self.packets.append(Packet(self.clock(), "text", packet_id, route.name if route else "default", msg))
+
+    def send_nodeinfo(self, route: Route | None = None) -> None:
+        self.packets.append(Packet(self.clock(), "nodeinfo", None, route.name if route else "default", ""))
+
+
+def _iso(t: float) -> str:
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+class _VirtualTimeFormatter(logging.Formatter):
+    def __init__(self, clock: Callable[[], float]) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.clock = clock
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        return _iso(self.clock())
+
+
+async def replay(
+    records: list[Record], specs: list[SourceSpec], loop: VirtualClockLoop, end: float, sink: CaptureSink
+) -> tuple[RecordedUpstream, Sender]:
+    upstream = RecordedUpstream(records, loop.wall)
+    with contextlib.ExitStack() as stack:
+        # Everything that reads a clock or touches the network/radio, redirected to the replay.
+        stack.enter_context(mock.patch.object(common, "fetch_json_with_retries", upstream.fetch))
+        stack.enter_context(mock.patch.object(udp, "send_text", sink.send_text))
+        stack.enter_context(mock.patch.object(udp, "send_nodeinfo", sink.send_nodeinfo))
+        stack.enter_context(mock.patch.object(sent_ledger, "time", loop.wall))
+        stack.enter_context(mock.patch.object(airtime, "monotonic", loop.time))
+        stack.enter_context(mock.patch.object(sender_module, "monotonic", loop.time))
+
+        ledger = sent_ledger.from_config()
+        sender = Sender(executor=_InlineExecutor())
+        scheduler = SourceScheduler(specs, None, push=sender.push, ledger=ledger, warmup=config.WARMUP)  # type: ignore[arg-type]
+        t_sched = asyncio.create_task(scheduler.run(), name="task:scheduler")
+        t_tx = asyncio.create_task(sender.run(), name="task:sender")
+        await asyncio.sleep(max(0.0, end - loop.wall()))
+        t_sched.cancel()
+        await asyncio.gather(t_sched, return_exceptions=True)
+        await sender.flush()
+        t_tx.cancel()
+        await asyncio.gather(t_tx, return_exceptions=True)
+        sender.close()
+    return upstream, sender
+
+
+def build_report(
+    records: list[Record], specs: list[SourceSpec], start: float, end: float,
+    upstream: RecordedUpstream, sender: Sender, sink: CaptureSink, elapsed: float,
+) -> dict[str, Any]:
+    texts = [p for p in sink.packets if p.kind == "text"]
+    repeats = Counter(p.packet_id for p in texts)
+    return {
+        "meta": {
+            "start": _iso(start),
+            "end": _iso(end),
+            "records": len(records),
+            "sources": {s.name: {"interval": s.interval, "min": s.min_interval, "max": s.max_interval} for s in specs},
+            "warmup": config.WARMUP,
+            "ledger": config.LEDGER_ENABLED,
+            "compact": config.COMPACT,
+            "airtime_rate": config.TX_AIRTIME_RATE,
+            "elapsed_s": round(elapsed, 3),
+        },
+        "summary": {
+            "packets": len(texts),
+            "unique_ids": len(repeats),
+            "repeated_ids": sum(1 for n in repeats.values() if n > 1),
+            "nodeinfo": len(sink.packets) - len(texts),
+            "by_route": dict(Counter(p.route for p in texts)),
+            "fetches": dict(upstream.fetches),
+            "failed_fetches": dict(upstream.failures),
+            "not_modified": dict(upstream.not_modified),
+            "max_queue_wait_s": round(sender.max_wait, 3),
+        },
+        "packets": [
+            {
+                "t": _iso(p.t),
+                "offset_s": round(p.t - start, 3),
+                "kind": p.kind,
+                "id": f"{p.packet_id:08x}" if p.packet_id is not None else None,
+                "route": p.route,
+                "text": p.text,
+            }
+            for p in sink.packets
+        ],
+    }
+
+
+def _print(report: dict[str, Any], show_packets: bool) -> None:
+    meta, summary = report["meta"], report["summary"]
+    print(f"replayed {meta['start']} .. {meta['end']} ({meta['records']} records) in {meta['elapsed_s']}s")
+    if show_packets:
+        for p in report["packets"]:
+            print(f"  {p['t']}  {p['kind']:8} {p['id'] or '-':8}  {p['route']:10} {p['text']}")
+    print(f"packets={summary['packets']} unique_ids={summary['unique_ids']} repeated_ids={summary['repeated_ids']} "
+          f"nodeinfo={summary['nodeinfo']} max_queue_wait={summary['max_queue_wait_s']}s")
+    for name in sorted(summary["fetches"]):
+        print(f"  {name}: fetches={summary['fetches'][name]} failed={summary['failed_fetches'].get(name, 0)} "
+              f"not_modified={summary['not_modified'].get(name, 0)}")
+    for route, n in sorted(summary["by_route"].items()):
+        print(f"  route {route}: {n} packets")
+
+
+def _compare(report: dict[str, Any], baseline: dict[str, Any], tolerance: int) -> list[str]:
+    """Differences in emitted packets against a saved report."""
+    def ids(r: dict[str, Any]) -> Counter[str]:
+        return Counter(p["id"] for p in r["packets"] if p["kind"] == "text")
+
+    out: list[str] = []
+    cur, ref = report["summary"]["packets"], baseline["summary"]["packets"]
+    if abs(cur - ref) > tolerance:
+        out.append(f"packets: {ref} -> {cur} ({cur - ref:+d})")
+    added, removed = ids(report) - ids(baseline), ids(baseline) - ids(report)
+    if added or removed:
+        out.append(f"packet ids: +{sum(added.values())} -{sum(removed.values())}")
+    return out
+
+
+async def record(path: Path, hours: float, specs: list[SourceSpec]) -> None:
+    """Poll the live sources at their base intervals and append changed responses to `path`."""
+    end = time.time() + hours * 3600
+    last: dict[str, str] = {}
+    async with transport.create_session([s.interval for s in specs]) as session:
+        with _open(path, "a") as out:
+            while time.time() < end:
+                started = time.time()
+                for spec in specs:
+                    async with session.get(spec.url, params=spec.params) as resp:
+                        body = await resp.json() if resp.status < 400 else None
+                        line = json.dumps({"source": spec.name, "status": resp.status, "body": body},
+                                          ensure_ascii=False, separators=(",", ":"))
+                    if last.get(spec.name) == line:
+                        continue
+                    last[spec.name] = line
+                    out.write(f'{{"t":{started:.1f},{line[1:]}\n')
+                    out.flush()
+                    print(f"{_iso(started)} {spec.name} {resp.status} recorded")
+                await asyncio.sleep(max(0.0, min(s.interval for s in specs) - (time.time() - started)))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.replay", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", type=Path, nargs="?", help="JSON lines recording (.jsonl or .jsonl.gz)")
+    parser.add_argument("--synthetic", metavar="SCENARIO", choices=sorted(payloads.SCENARIOS),
+                        help="replay a synthetic timeline of a bench scenario instead of a recording")
+    parser.add_argument("--hours", type=float, default=24.0, help="synthetic timeline / recording length (default 24)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the timeline and the scheduler jitter")
+    parser.add_argument("--report", type=Path, help="write the packet report as JSON")
+    parser.add_argument("--compare", type=Path, help="compare with a saved report and fail if packets changed")
+    parser.add_argument("--tolerance", type=int, default=0, help="allowed difference in packet count (default 0)")
+    parser.add_argument("--packets", action="store_true", help="print every packet")
+    parser.add_argument("--record", type=Path, metavar="PATH", help="record live responses to PATH for --hours")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the daemon's log (in virtual time)")
+    args = parser.parse_args(argv)
+
+    specs = load_sources(config.SOURCES, use_entry_points=config.SOURCE_ENTRY_POINTS)
+    if args.record:
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
+        asyncio.run(record(args.record, args.hours, specs))
+        return 0
+
+    if args.synthetic:
+        records = [Record(r["t"], r["source"], r["status"], r["body"])
+                   for r in payloads.timeline(args.synthetic, args.hours, seed=args.seed)]
+    elif args.recording:
+        records = read_recording(args.recording)
+    else:
+        parser.error("a recording, --synthetic or --record is required")
+    if not records:
+        parser.error("the recording is empty")
+    for name in sorted({r.source for r in records} - {s.name for s in specs}):
+        print(f"warning: records for unconfigured source {name} are ignored", file=sys.stderr)
+
+    start = records[0].t - 1
+    end = records[-1].t + max(s.max_interval or s.interval for s in specs)
+    if args.synthetic:
+        end = max(end, start + args.hours * 3600)
+
+    random.seed(args.seed)  # scheduler jitter and start offsets
+    loop = VirtualClockLoop(start)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(_VirtualTimeFormatter(loop.wall))
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, handlers=[handler])
+
+    sink = CaptureSink(loop.wall)
+    started = time.perf_counter()
+    try:
+        upstream, sender = loop.run_until_complete(replay(records, specs, loop, end, sink))
+    finally:
+        loop.close()
+    report = build_report(records, specs, start, end, upstream, sender, sink, time.perf_counter() - started)
+    _print(report, args.packets)
+
+    if args.report:
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+        print(f"report written to {args.report}")
+    if args.compare:
+        diffs = _compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.tolerance)
+        if diffs:
+            print("packets changed:")
+            for line in diffs:
+                print(f"  {line}")
+            return 1
+        print("packets unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
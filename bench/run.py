@@ -0,0 +1,314 @@
+"""
+Benchmarks for the per-poll hot path: fetch + parse of both sources against a
+local stub server, and the chunker / replacement / packet-ID helpers.
+
+    python -m bench.run                           # all scenarios
+    python -m bench.run -s nationwide -n 20       # one scenario, 20 iterations
+    python -m bench.run --save bench/baseline.json
+    python -m bench.run --compare bench/baseline.json
+    python -m bench.run --capture storm-2025-10   # record live payloads as a fixture set
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import gc
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from app import config, transport
+from app.compact import compact
+from app.sources import smhi, vma
+from app.sources.cache import RenderCache
+from app.sources.common import SourceState, fetch_messages
+from app.util import make_message_id, normalize_message, truncate_utf8, truncate_utf8_many
+
+from . import payloads
+
+log = logging.getLogger("bench")
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    items: int
+    times: list[float]
+    peak_kib: float
+    retained_blocks: int
+
+    @property
+    def median_ms(self) -> float:
+        return statistics.median(self.times) * 1000
+
+    @property
+    def min_ms(self) -> float:
+        return min(self.times) * 1000
+
+    @property
+    def items_per_s(self) -> float:
+        median = statistics.median(self.times)
+        return self.items / median if median else float("inf")
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "items": self.items,
+            "median_ms": round(self.median_ms, 4),
+            "min_ms": round(self.min_ms, 4),
+            "items_per_s": round(self.items_per_s, 1),
+            "peak_kib": round(self.peak_kib, 1),
+            "retained_blocks": self.retained_blocks,
+        }
+
+
+async def _measure(
+    name: str, items: int, func: Callable[[], Awaitable[Any]], iterations: int, setup: Callable[[], None] | None = None
+) -> Result:
+    """Time `iterations` runs (after one warm-up), then one more run under tracemalloc."""
+    times: list[float] = []
+    for i in range(iterations + 1):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        await func()
+        if i:  # the first run warms imports, regex caches and connections
+            times.append(time.perf_counter() - started)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    await func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return Result(name, items, times, (peak - base) / 1024, retained)
+
+
+def _sync(func: Callable[[], Any]) -> Callable[[], Awaitable[Any]]:
+    async def run() -> Any:
+        return func()
+    return run
+
+
+def _text_corpus(
+    smhi_data: list[Any], vma_data: dict[str, Any]
+) -> tuple[list[str], list[str], list[tuple[str, str]]]:
+    """Full (unchunked) message texts, raw SMHI area names and SMHI time ranges from a scenario's payloads."""
+    texts: list[str] = []
+    area_names: list[str] = []
+    ranges: list[tuple[str, str]] = []
+    for alert in vma_data.get("alerts") or []:
+        text = vma._sv_message(alert)
+        if text:
+            texts.append(text)
+    for alert in smhi_data:
+        for wa in alert.get("warningAreas") or []:
+            level = (wa.get("warningLevel") or {}).get("sv", "")
+            area = (wa.get("areaName") or {}).get("sv", "")
+            event = (wa.get("eventDescription") or {}).get("sv", "")
+            area_names.append(area)
+            start, end = wa.get("approximateStart"), wa.get("approximateEnd")
+            if isinstance(start, str) and isinstance(end, str):
+                ranges.append((start, end))
+            texts.append(f"SMHI: {level} varning {smhi.apply_replacements(area)} - {event} "
+                         f"[{wa.get('approximateStart')} - {wa.get('approximateEnd')}]")
+    return texts, area_names, ranges
+
+
+async def _serve(smhi_body: bytes, vma_body: bytes) -> tuple[web.AppRunner, str]:
+    async def handle_smhi(_request: web.Request) -> web.Response:
+        return web.Response(body=smhi_body, content_type="application/json")
+
+    async def handle_vma(_request: web.Request) -> web.Response:
+        return web.Response(body=vma_body, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_get("/smhi", handle_smhi)
+    app.router.add_get("/vma", handle_vma)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def _reset_render_caches() -> None:
+    smhi._render_cache = RenderCache()
+    vma._render_cache = RenderCache()
+
+
+async def run_scenario(scenario: str, iterations: int) -> list[Result]:
+    smhi_body, vma_body = payloads.load(scenario)
+    smhi_data, vma_data = json.loads(smhi_body), json.loads(vma_body)
+    texts, area_names, ranges = _text_corpus(smhi_data, vma_data)
+    chunks = [c for t in texts for c in truncate_utf8(t)]
+    normalized = [normalize_message(c) for c in chunks]
+    log.info(
+        "%s: SMHI %.1f KiB (%d areas), VMA %.1f KiB (%d alerts), %d texts -> %d chunks",
+        scenario, len(smhi_body) / 1024, len(area_names), len(vma_body) / 1024,
+        len(vma_data.get("alerts") or []), len(texts), len(chunks),
+    )
+
+    results: list[Result] = []
+    runner, base = await _serve(smhi_body, vma_body)
+    try:
+        async with transport.create_session() as session:
+            variants = (
+                ("smhi.fetch_messages", dataclasses.replace(smhi.SOURCE, url=f"{base}/smhi", stream_item=None)),
+                ("smhi.fetch_messages[stream]", dataclasses.replace(smhi.SOURCE, url=f"{base}/smhi", stream_item=smhi.prefilter)),
+                ("vma.fetch_messages", dataclasses.replace(vma.SOURCE, url=f"{base}/vma", params=None)),
+            )
+            for name, spec in variants:
+                state = SourceState(spec)
+                items = len(smhi_data) if spec.name == "SMHI" else len(vma_data.get("alerts") or [])
+
+                async def poll(state: SourceState = state) -> None:
+                    await fetch_messages(session, state, log)
+
+                # cold: every alert is rendered; warm: unchanged alerts come from the render cache
+                results.append(await _measure(f"{name}[cold]", items, poll, iterations, setup=_reset_render_caches))
+                results.append(await _measure(f"{name}[warm]", items, poll, iterations))
+    finally:
+        await runner.cleanup()
+
+    results.append(await _measure(
+        "truncate_utf8", len(texts), _sync(lambda: [truncate_utf8(t) for t in texts]), iterations))
+    results.append(await _measure(
+        "truncate_utf8_many", len(texts), _sync(lambda: truncate_utf8_many(texts)), iterations))
+    results.append(await _measure(
+        "compact", len(texts), _sync(lambda: [compact(t) for t in texts]), iterations))
+    results.append(await _measure(
+        "apply_replacements", len(area_names), _sync(lambda: [smhi.apply_replacements(a) for a in area_names]), iterations))
+    # per-area time range rendering: uncached parses, converts and formats every area;
+    # cold starts each run with an empty cache (one poll), warm keeps it across runs (later polls)
+    render_range = smhi.time_range.__wrapped__
+    results.append(await _measure(
+        "smhi.time_range[uncached]", len(ranges), _sync(lambda: [render_range(s, e) for s, e in ranges]), iterations))
+    results.append(await _measure(
+        "smhi.time_range[cold]", len(ranges), _sync(lambda: [smhi.time_range(s, e) for s, e in ranges]), iterations,
+        setup=smhi.time_range.cache_clear))
+    results.append(await _measure(
+        "smhi.time_range[warm]", len(ranges), _sync(lambda: [smhi.time_range(s, e) for s, e in ranges]), iterations))
+    results.append(await _measure(
+        "make_message_id", len(normalized), _sync(lambda: [make_message_id(c) for c in normalized]), iterations))
+    return results
+
+
+def _print(scenario: str, results: list[Result], baseline: dict[str, Any] | None) -> None:
+    print(f"\n== {scenario} ==")
+    print(f"{'benchmark':34} {'items':>6} {'median ms':>10} {'min ms':>9} {'items/s':>11} {'peak KiB':>9} {'blocks':>7}"
+          + ("  vs baseline" if baseline else ""))
+    for r in results:
+        line = (f"{r.name:34} {r.items:6d} {r.median_ms:10.3f} {r.min_ms:9.3f} {r.items_per_s:11.0f} "
+                f"{r.peak_kib:9.1f} {r.retained_blocks:7d}")
+        ref = (baseline or {}).get(f"{scenario}/{r.name}")
+        if ref:
+            line += f"  time {_delta(r.min_ms, ref['min_ms'])}, peak {_delta(r.peak_kib, ref['peak_kib'])}"
+        print(line)
+
+
+def _delta(value: float, ref: float) -> str:
+    if not ref:
+        return "n/a"
+    return f"{(value - ref) / ref:+.1%}"
+
+
+def _regressions(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Benchmarks whose best time or peak memory grew by more than `threshold` over the baseline."""
+    out: list[str] = []
+    for key, ref in baseline.items():
+        cur = current.get(key)
+        if cur is None:
+            continue
+        # best-of-N time is far less sensitive to scheduler noise than the median
+        for metric in ("min_ms", "peak_kib"):
+            # ignore noise on sub-millisecond timings and tiny allocations
+            floor = 0.5 if metric == "min_ms" else 16.0
+            if ref[metric] > floor and cur[metric] > ref[metric] * (1 + threshold):
+                out.append(f"{key} {metric}: {ref[metric]} -> {cur[metric]} ({_delta(cur[metric], ref[metric])})")
+    return out
+
+
+async def capture(name: str) -> None:
+    """Download the live SMHI and VMA payloads into fixtures/<name>.*.json."""
+    payloads.FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    async with aiohttp.ClientSession() as session:
+        for source, url in (("smhi", config.SMHI_URL), ("vma", config.VMA_URL)):
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=60)) as resp:
+                resp.raise_for_status()
+                body = await resp.read()
+            path = payloads.FIXTURES_DIR / f"{name}.{source}.json"
+            path.write_bytes(body)
+            print(f"captured {url} -> {path} ({len(body) / 1024:.1f} KiB)")
+
+
+async def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-s", "--scenario", action="append", help="scenario or fixture set (repeatable)")
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    parser.add_argument("--save", type=Path, help="write results as a baseline JSON file")
+    parser.add_argument("--compare", type=Path, help="compare against a baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / growth (default 0.25)")
+    parser.add_argument("--capture", metavar="NAME", help="record live payloads as fixture set NAME and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(message)s")
+    # Keep per-alert log lines out of the timings; the app's loggers only warn from here on.
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    if args.capture:
+        await capture(args.capture)
+        return 0
+
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else None
+    current: dict[str, Any] = {}
+    for scenario in args.scenario or payloads.scenarios():
+        results = await run_scenario(scenario, max(1, args.iterations))
+        _print(scenario, results, baseline)
+        current.update({f"{scenario}/{r.name}": r.as_dict() for r in results})
+
+    if args.save:
+        args.save.write_text(json.dumps({
+            "meta": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "iterations": args.iterations,
+                "max_bytes": config.MESHTASTIC_MAX_BYTES,
+                "max_messages": config.MESHTASTIC_MAX_MESSAGES,
+            },
+            "results": current,
+        }, indent=2) + "\n")
+        print(f"\nbaseline written to {args.save}")
+
+    if baseline is not None:
+        regressions = _regressions(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nno regressions over {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
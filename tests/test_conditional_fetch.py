@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any
+
+import aiohttp
+from aiohttp import web
+
+from app.sources.common import SourceState, fetch_messages
+from app.sources.registry import SourceSpec
+from app.util import Message
+
+log = logging.getLogger(__name__)
+
+
+async def _serve() -> tuple[web.AppRunner, str, list[int]]:
+    statuses: list[int] = []
+
+    async def feed(request: web.Request) -> web.Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            statuses.append(304)
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        statuses.append(200)
+        return web.json_response([{"id": 1}], headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/feed", feed)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/feed", statuses
+
+
+def test_parse_failure_refetches_instead_of_304() -> None:
+    async def run() -> None:
+        runner, url, statuses = await _serve()
+        calls: list[Any] = []
+
+        def parse(data: Any) -> list[Message]:
+            calls.append(data)
+            if len(calls) == 1:
+                raise RuntimeError("worker crashed")
+            return [Message("VMA: test", 0, None)]
+
+        state = SourceState(SourceSpec(name="TEST", url=url, interval=60, parse=parse))
+        try:
+            async with aiohttp.ClientSession() as session:
+                try:
+                    await fetch_messages(session, state, log)
+                except RuntimeError:
+                    pass
+                else:
+                    raise AssertionError("parse error was swallowed")
+                msgs = await fetch_messages(session, state, log)
+                assert [m.text for m in msgs or []] == ["VMA: test"]
+                # Once parsed, the validators are used again.
+                assert [m.text for m in await fetch_messages(session, state, log) or []] == ["VMA: test"]
+        finally:
+            await runner.cleanup()
+        assert statuses == [200, 200, 304]
+        assert len(calls) == 2
+
+    asyncio.run(run())